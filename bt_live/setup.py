@@ -9,7 +9,7 @@ setup(
     name=package_name,
     version='1.0.0',
     packages=[package_name, package_name_django],
-    package_data={'': ['*.js']},
+    package_data={'': ['*.js', '*.css']},
     include_package_data=True,
     package_dir={
         package_name:
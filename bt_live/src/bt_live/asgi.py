@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from bt_live.ros_node import start
+
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bt_live.settings')
 
 application = get_asgi_application()
+
+# the ROS node is shared by all requests, it is started once with the server
+start()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import threading
+from typing import AsyncIterator, Dict, Optional, Set
+
+from bt_live.store import LiveStateStore
+
+from bt_view.bt_view import COLORS_PER_RETURN_STATE_VALUE
+
+from btlib.common import NODE_STATE
+
+# number of updates a client may lag behind before it is resynced
+CLIENT_QUEUE_SIZE = 64
+# seconds after which a client gets the full state again, this also keeps
+# idle connections open
+SNAPSHOT_S = 10.
+# color per state code, sent with every snapshot
+STATE_COLORS = [COLORS_PER_RETURN_STATE_VALUE[None]] + [
+    COLORS_PER_RETURN_STATE_VALUE[code]
+    for code in range(1, max(s.value for s in NODE_STATE) + 1)]
+
+
+class BroadcastHub():
+    """
+    Fan out state updates from the ROS thread to many asyncio clients.
+
+    The states are kept in a `LiveStateStore`. Clients get the full state
+    when they connect and every `SNAPSHOT_S` seconds, in between they only
+    get the nodes that changed. The version of the store is sent as
+    sequence number, so that clients can detect missing updates.
+    `publish` is called from the ROS thread, everything else must be called
+    from the event loop that serves the clients.
+    """
+
+    def __init__(
+        self,
+        store: LiveStateStore,
+        queue_size: int = CLIENT_QUEUE_SIZE
+    ):
+        self.store = store
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._clients: Set[asyncio.Queue] = set()
+
+    def publish(
+        self,
+        states: Dict[int, int],
+        timestamp: int = 0,
+        transitions: Optional[Dict[int, int]] = None
+    ):
+        """
+        Set the states of some nodes and send the changes to all clients.
+
+        :param states: State code per node uid, unknown uids are ignored.
+        :param timestamp: Time of the states in nanoseconds.
+        :param transitions: Number of state changes per node uid, see
+            `LiveStateStore.update`.
+        """
+        changed = self.store.update(states, timestamp, transitions)
+        if not changed:
+            return
+        delta = json.dumps({
+            'seq': self.store.snapshot.version,
+            'timestamp': timestamp,
+            'uids': list(changed.keys()),
+            'states': list(changed.values()),
+        })
+        with self._lock:
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._fan_out, delta)
+
+    def snapshot(self) -> str:
+        """Get the full state as json message."""
+        snapshot = self.store.snapshot
+        return json.dumps({
+            'seq': snapshot.version,
+            'timestamp': snapshot.timestamp,
+            'full': True,
+            'colors': STATE_COLORS,
+            'uids': self.store.uids,
+            'states': snapshot.states.tolist(),
+        })
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a client, its queue starts with the full state."""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            assert self._loop in (None, loop), \
+                'All clients must be served from the same event loop'
+            self._loop = loop
+            self._clients.add(queue)
+        queue.put_nowait(self.snapshot())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Remove a client."""
+        self._clients.discard(queue)
+
+    def _fan_out(self, message: str):
+        for queue in list(self._clients):
+            if queue.full():
+                # the client is too slow, replace its backlog by the state
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot())
+            else:
+                queue.put_nowait(message)
+
+    async def events(self) -> AsyncIterator[str]:
+        """Stream the updates to one client as server-sent events."""
+        loop = asyncio.get_running_loop()
+        queue = self.subscribe()
+        next_snapshot = loop.time() + SNAPSHOT_S
+        try:
+            while True:
+                timeout = next_snapshot - loop.time()
+                if timeout <= 0:
+                    next_snapshot = loop.time() + SNAPSHOT_S
+                    yield f'data: {self.snapshot()}\n\n'
+                    continue
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    continue
+                yield f'data: {message}\n\n'
+        finally:
+            self.unsubscribe(queue)
@@ -1,9 +1,15 @@
 import os
 import tempfile
+import threading
+from typing import Optional
 
-from bt_view.bt_view import COLORS_PER_RETURN_STATE, draw_pygraphviz
+from bt_live.hub import BroadcastHub
+from bt_live.store import LiveStateStore, UNKNOWN_STATE
+
+from bt_view.bt_view import draw_pygraphviz
 
 from btlib.bts import fbl_to_networkx
+from btlib.coalesce import Coalescer, DEFAULT_RATE_HZ
 from btlib.common import NODE_STATE
 
 from nav2_msgs.msg import BehaviorTreeLog, BehaviorTreeStatusChange
@@ -25,27 +31,12 @@ def _has_uid(bt_status_change: BehaviorTreeStatusChange) -> bool:
     return '_uid' in bt_status_change.__slots__
 
 
-class SingletonBtLiveNode():
-    _instance = None
-
-    def __init__(self, args=None):
-        if SingletonBtLiveNode._instance is None:
-            SingletonBtLiveNode._instance = BtLiveNode(args=args)
-
-    def __getattr__(self, name):
-        return getattr(self._instance, name)
-
-    def __call__(self, *args, **kwargs):
-        return self._instance(*args, **kwargs)
-
-
 class BtLiveNode(Node):
 
     def __init__(self, args=None):
         rclpy.init(args=args)
         super().__init__('bt_live_node')
         self.get_logger().info('Starting bt_live_node')
-        self.data = {}
         self.sub = self.create_subscription(
             BehaviorTreeLog,
             '/behavior_tree_log',
@@ -70,7 +61,20 @@ class BtLiveNode(Node):
         self.img_path = os.path.join(tempfile.gettempdir(), 'bt_trace')
         self.get_logger().info(f'{self.img_path=}')
 
+        self.param_max_rate = self.declare_parameter(
+            'max_rate',
+            DEFAULT_RATE_HZ,
+            ParameterDescriptor(
+                description='Maximum number of updates sent per second.'))
+        # all changes within one frame are sent at once
+        self.coalescer = Coalescer(self.param_max_rate.value)
+        self.timestamp = 0
+
         self.g = fbl_to_networkx(self.fbl_file)
+        self.store = LiveStateStore(list(self.g.nodes))
+        self.hub = BroadcastHub(self.store)
+        self.timer = self.create_timer(
+            self.coalescer.period_s, self.timer_callback)
 
         # make first image with gray nodes
         draw_pygraphviz(
@@ -78,9 +82,14 @@ class BtLiveNode(Node):
             self.img_path,
             lambda _: None,)
 
+    def start(self):
+        """Spin the node in its own thread, it publishes to `self.hub`."""
+        self._thread = threading.Thread(
+            target=rclpy.spin, args=(self,), name='bt_live_ros', daemon=True)
+        self._thread.start()
+
     def callback(self, msg: BehaviorTreeStatusChange):
         event_log = msg.event_log
-        self.data = {'timestamp': Time().from_msg(msg.timestamp).nanoseconds}
         for event in event_log:
             assert isinstance(event, BehaviorTreeStatusChange)
             if _has_uid(event):
@@ -90,10 +99,37 @@ class BtLiveNode(Node):
                      if state.name == event.current_status),
                     None,
                 )
-                self.data[event.uid] = COLORS_PER_RETURN_STATE[
-                    found_state
-                ]
-
-    def spin_once(self):
-        rclpy.spin_once(self)
-        return self.data
+                # one event at a time, so that repeated changes of a node
+                # within this message are counted
+                self.coalescer.add({event.uid: (
+                    UNKNOWN_STATE if found_state is None
+                    else found_state.value)})
+        self.timestamp = Time().from_msg(msg.timestamp).nanoseconds
+
+    def timer_callback(self):
+        frame = self.coalescer.flush()
+        if frame.dropped:
+            self.get_logger().debug(
+                f'Skipped {frame.dropped} state changes to keep the '
+                'update rate.')
+        if frame.states:
+            self.hub.publish(
+                frame.states, self.timestamp, frame.transitions)
+
+
+_node: Optional[BtLiveNode] = None
+
+
+def start(args=None) -> BtLiveNode:
+    """Start the node, this is done once when the server starts."""
+    global _node
+    if _node is None:
+        _node = BtLiveNode(args=args)
+        _node.start()
+    return _node
+
+
+def get_node() -> BtLiveNode:
+    """Get the node that was started with `start`."""
+    assert _node is not None, 'The bt_live node was not started'
+    return _node
@@ -31,6 +31,8 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    # serves `runserver` through ASGI, so that the event stream is async
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -68,6 +70,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'bt_live.wsgi.application'
+ASGI_APPLICATION = 'bt_live.asgi.application'
 
 
 # Database
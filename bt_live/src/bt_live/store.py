@@ -0,0 +1,103 @@
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+# state code of nodes that did not report a state yet
+UNKNOWN_STATE = 0
+
+
+class Snapshot(NamedTuple):
+    """The state of all nodes at one version, the arrays are read-only."""
+
+    version: int
+    timestamp: int
+    states: np.ndarray
+    transitions: np.ndarray
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+class LiveStateStore():
+    """
+    The latest state code (see `NODE_STATE`) of every node of the tree.
+
+    Updates come from one writer, the ROS thread, and create a new
+    `Snapshot` with the next version. Readers get the current snapshot
+    without a lock, it never changes after it was published.
+    """
+
+    def __init__(self, uids: List[int]):
+        self.uids = list(uids)
+        self._index = {uid: i for i, uid in enumerate(self.uids)}
+        self._lock = threading.Lock()
+        self._snapshot = Snapshot(
+            version=0,
+            timestamp=0,
+            states=_read_only(
+                np.full(len(self.uids), UNKNOWN_STATE, dtype=np.uint8)),
+            transitions=_read_only(
+                np.zeros(len(self.uids), dtype=np.int64)))
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """Get the current snapshot."""
+        return self._snapshot
+
+    def update(
+        self,
+        states: Dict[int, int],
+        timestamp: int,
+        transitions: Optional[Dict[int, int]] = None
+    ) -> Dict[int, int]:
+        """
+        Set the states of some nodes.
+
+        :param states: State code per node uid, unknown uids are ignored.
+        :param timestamp: Time of the states in nanoseconds.
+        :param transitions: Number of state changes per node uid since the
+            last update, e.g. from `Coalescer.flush`. They also count the
+            changes that were merged into `states`. By default, every node
+            whose state changed counts one transition.
+        :return: The states of the nodes that changed.
+        """
+        with self._lock:
+            old = self._snapshot
+            changed = {
+                uid: state for uid, state in states.items()
+                if uid in self._index
+                and old.states[self._index[uid]] != state}
+            if transitions is None:
+                transitions = {uid: 1 for uid in changed}
+            counted = {
+                uid: n for uid, n in transitions.items()
+                if uid in self._index and n > 0}
+            if not changed and not counted:
+                return changed
+            new_states = old.states.copy()
+            if changed:
+                new_states[[self._index[uid] for uid in changed]] = \
+                    list(changed.values())
+            new_transitions = old.transitions.copy()
+            if counted:
+                new_transitions[[self._index[uid] for uid in counted]] += \
+                    list(counted.values())
+            self._snapshot = Snapshot(
+                version=old.version + 1,
+                timestamp=timestamp,
+                states=_read_only(new_states),
+                transitions=_read_only(new_transitions))
+        return changed
+
+    def to_dict(self, snapshot: Snapshot) -> Dict:
+        """Get a snapshot as json serializable dict keyed by node uid."""
+        return {
+            'version': snapshot.version,
+            'timestamp': snapshot.timestamp,
+            'states': dict(zip(self.uids, snapshot.states.tolist())),
+            'transitions': dict(
+                zip(self.uids, snapshot.transitions.tolist())),
+        }
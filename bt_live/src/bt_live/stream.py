@@ -1,21 +1,14 @@
-import json
-
-from bt_live.ros_node import SingletonBtLiveNode
+from bt_live.ros_node import get_node
 
 from django.http import StreamingHttpResponse
 
 
-def response_generator(node):
-    while True:
-        data = node.spin_once()
-        if data:
-            print(data)
-            yield json.dumps(data)
-        yield '\n'
-
-
-def msg(_):
-    node = SingletonBtLiveNode()
-    return StreamingHttpResponse(
-        response_generator(node),
+async def msg(_):
+    """Stream the node states as server-sent events."""
+    response = StreamingHttpResponse(
+        get_node().hub.events(),
         content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # tell proxies like nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -25,6 +25,9 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('data', views.data, name='data'),
+    path('view.js', views.asset, {'name': 'view.js'}, name='view_js'),
+    path('bt_live.css', views.asset, {'name': 'bt_live.css'},
+         name='bt_live_css'),
     path('msg', stream.msg, name='msg'),
     path('favicon.png', views.favicon_png, name='favicon_png'),
     path('favicon.svg', views.favicon_svg, name='favicon_svg'),
@@ -1,32 +1,120 @@
-import json
+import gzip
+from hashlib import sha256
+import mimetypes
 import os
-import random
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
 
-from bt_live.ros_node import SingletonBtLiveNode
+from bt_live.ros_node import get_node
 
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import (
+    http_date, parse_etags, parse_http_date_safe, quote_etag)
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
-def index(request):
-    node = SingletonBtLiveNode()
-    img_path = node.img_path
-
-    fname_svg = img_path + '.svg'
-    with open(fname_svg, 'r') as f:
-        svg_str = f.read()
-    assert len(svg_str)
-
-    fname_js = os.path.join(
-        os.path.dirname(__file__),
-        '..',
-        'bt_live_django',
-        'view.js'
-    )
-    with open(fname_js, 'r') as f:
-        js_str = f.read()
-    assert len(js_str)
-
-    index_page_str = (
+ASSETS_FOLDER = os.path.join(
+    os.path.dirname(__file__),
+    '..',
+    'bt_live_django'
+)
+# the urls of the assets contain their hash, so they can be cached forever
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+FAVICON_CACHE_CONTROL = 'public, max-age=86400'
+# the page changes with the tree, browsers must revalidate it
+PAGE_CACHE_CONTROL = 'no-cache'
+# smaller bodies are not compressed
+MIN_COMPRESS_BYTES = 256
+
+
+class CachedResponse(NamedTuple):
+    """A response body in all encodings with the headers to revalidate it."""
+
+    content_type: str
+    digest: str
+    last_modified: float
+    bodies: Dict[str, bytes]
+
+
+def _make_cached_response(
+    body: bytes,
+    content_type: str,
+    last_modified: float
+) -> CachedResponse:
+    """Compress a body once, the encodings are keyed as in HTTP."""
+    bodies = {'identity': body}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        bodies['gzip'] = gzip.compress(body, mtime=0)
+        if brotli is not None:
+            bodies['br'] = brotli.compress(body)
+    return CachedResponse(
+        content_type=content_type,
+        digest=sha256(body).hexdigest()[:16],
+        last_modified=last_modified,
+        bodies=bodies)
+
+
+def _serve(request, cached: CachedResponse, cache_control: str):
+    """Answer a request from memory, or with 304 if the client has it."""
+    etag = quote_etag(cached.digest)
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        not_modified = etag in etags or '*' in etags
+    else:
+        since = parse_http_date_safe(
+            request.headers.get('If-Modified-Since', ''))
+        not_modified = (
+            since is not None and int(cached.last_modified) <= since)
+    if not_modified:
+        response = HttpResponseNotModified()
+    else:
+        accepted = {
+            encoding.split(';')[0].strip()
+            for encoding in request.headers.get(
+                'Accept-Encoding', '').split(',')}
+        encoding = next(
+            (encoding for encoding in ('br', 'gzip')
+             if encoding in accepted and encoding in cached.bodies),
+            'identity')
+        response = HttpResponse(
+            cached.bodies[encoding], content_type=cached.content_type)
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    if len(cached.bodies) > 1:
+        response['Vary'] = 'Accept-Encoding'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(cached.last_modified)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+_files: Dict[str, CachedResponse] = {}
+
+
+def _get_file(fname: str) -> CachedResponse:
+    """Read a file that does not change while the server runs, once."""
+    if fname not in _files:
+        with open(fname, 'rb') as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(fname)[0]
+        assert content_type is not None, f'Unknown file type of {fname}'
+        _files[fname] = _make_cached_response(
+            body, content_type, os.path.getmtime(fname))
+    return _files[fname]
+
+
+def _asset_url(name: str) -> str:
+    """Url of an asset that changes when the asset changes."""
+    digest = _get_file(os.path.join(ASSETS_FOLDER, name)).digest
+    return f'{name}?v={digest}'
+
+
+def _make_index_page(svg_str: str) -> str:
+    return (
         """
         <!DOCTYPE html>
         <html>
@@ -35,66 +123,93 @@ def index(request):
         <!-- favicon -->
         <link rel=icon href=favicon.png sizes=32x32 type=image/png>
         <link rel=icon href=favicon.svg sizes=any type=image/svg+xml>
-        <!-- jquery -->
-        <script src="https://ajax.googleapis.com/ajax/libs/jquery/3.6.4/jquery.min.js"></script>
-        <!-- w3 stylesheet -->
-        <link rel="stylesheet" href="https://www.w3schools.com/w3css/4/w3.css">
-        <link rel="stylesheet" href="https://fonts.googleapis.com/css?family=Lato">
-        <link
-            rel="stylesheet"
-            href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/4.7.0/css/font-awesome.min.css"
-        >
-        <!-- pan and zoom -->
-        <script src='https://unpkg.com/panzoom@9.4.0/dist/panzoom.min.js'></script>
+        """
+        +
+        f'<link rel="stylesheet" href="{_asset_url("bt_live.css")}">\n'
+        +
+        f'<script src="{_asset_url("view.js")}" defer></script>'
+        +
+        """
         </head>
         <body>
 
         <!-- Navbar -->
-        <div class="w3-top">
-            <div class="w3-bar w3-black w3-card">
-                <li class="w3-bar-item w3-padding-large w3-large">bt_live</li>
-                <li class="w3-bar-item w3-padding-large w3-right" id="last_update">..</li>
-            </div>
-        </div>
-        <br><br><br>
+        <ul class="navbar">
+            <li class="navbar-item navbar-title">bt_live</li>
+            <li class="navbar-item navbar-right" id="last_update">..</li>
+        </ul>
+        <div id="tree">
         """
         +
         f'{svg_str}'
         +
         """
-        <script>
-        """
-        +
-        f'{js_str}'
-        +
-        """
-        </script>
+        </div>
         </body>
         </html>
         """)
-    return HttpResponse(index_page_str)
+
+
+_index_lock = threading.Lock()
+_index: Optional[Tuple[Tuple[int, int], CachedResponse]] = None
+
+
+def _get_index() -> CachedResponse:
+    """Get the page, it is built again only when the tree image changes."""
+    global _index
+    fname_svg = get_node().img_path + '.svg'
+    stat = os.stat(fname_svg)
+    key = (stat.st_mtime_ns, stat.st_size)
+    index = _index
+    if index is not None and index[0] == key:
+        return index[1]
+    with _index_lock:
+        if _index is None or _index[0] != key:
+            with open(fname_svg, 'r') as f:
+                svg_str = f.read()
+            assert len(svg_str)
+            _index = (key, _make_cached_response(
+                _make_index_page(svg_str).encode(),
+                'text/html; charset=utf-8',
+                stat.st_mtime))
+        return _index[1]
+
+
+def index(request):
+    return _serve(request, _get_index(), PAGE_CACHE_CONTROL)
+
+
+def asset(request, name):
+    """Serve the scripts and styles of the page."""
+    return _serve(
+        request,
+        _get_file(os.path.join(ASSETS_FOLDER, name)),
+        ASSET_CACHE_CONTROL)
 
 
 def data(request):
-    states = {i: random.randint(1, 4) for i in range(100)}
-    return HttpResponse(
-        json.dumps(states)
-    )
+    """Get the state and number of transitions of every node."""
+    store = get_node().store
+    return JsonResponse(store.to_dict(store.snapshot))
 
 
 def favicon_png(request):
-    with open(os.path.join(
-        # get_package_share_directory(''), TODO
-        'doc',
-        'logo32p.png'
-    ), 'rb') as f:
-        return HttpResponse(f.read(), content_type='image/png')
+    return _serve(
+        request,
+        _get_file(os.path.join(
+            # get_package_share_directory(''), TODO
+            'doc',
+            'logo32p.png'
+        )),
+        FAVICON_CACHE_CONTROL)
 
 
 def favicon_svg(request):
-    with open(os.path.join(
-        # get_package_share_directory(''), TODO
-        'doc',
-        'logo.svg'
-    ), 'rb') as f:
-        return HttpResponse(f.read(), content_type='image/svg+xml')
+    return _serve(
+        request,
+        _get_file(os.path.join(
+            # get_package_share_directory(''), TODO
+            'doc',
+            'logo.svg'
+        )),
+        FAVICON_CACHE_CONTROL)
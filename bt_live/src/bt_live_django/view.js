@@ -1,90 +1,114 @@
-const TIMEOUT = 5000; // ms
 var connected = false;
-var ourTimer = null;
-
-function newtimer(f) {
-    clearInterval(ourTimer);
-    ourTimer = setTimeout(f, TIMEOUT);
-}
-
-function getWidth(points) {
-    var previous_x = null;
-    var width = 0;
-    let ps = points.split(" ");
-    ps.forEach(function (p, _, _) {
-        var x = Number(p.split(",")[0])
-        if (previous_x === null) {
-            previous_x = x
-        } else {
-            width = Math.max(width, Math.abs(previous_x - x))
-        }
-    });
-    return width;
-}
+var seq = null;  // sequence number of the last applied update
+var colors = [];  // color per state code
+var polygons = {};  // box of each node by uid
 
 function disconnect() {
-    // set state to disconnected
+    // set state to disconnected, the EventSource reconnects by itself
     if (connected) {  // was connected, now disconnected
         console.log("disconnected");
         const d = new Date();
         document.getElementById("last_update").innerHTML = 'Disconnected since: ' + d.toLocaleTimeString();
         connected = false;
-        newtimer(connect);
     }
 }
 
+function paint(uids, states) {
+    // color only the given nodes
+    for (let i = 0; i < uids.length; i++) {
+        let polygon = polygons[uids[i]];
+        if (polygon === undefined) {
+            let node = document.getElementById(uids[i]);
+            polygon = node === null ? null : node.querySelector("polygon");
+            polygons[uids[i]] = polygon;
+        }
+        if (polygon !== null) {
+            polygon.setAttribute("fill", colors[states[i]]);
+        }
+    }
+}
+
+function update(data) {
+    // apply a full snapshot or the nodes that changed since the last update
+    if (data.full) {
+        colors = data.colors;
+    } else if (data.seq <= seq) {
+        return true;  // already contained in the snapshot
+    } else if (data.seq > seq + 1) {
+        return false;  // missed updates
+    }
+    seq = data.seq;
+    paint(data.uids, data.states);
+    return true;
+}
+
 function connect() {
-    // try to connect
     console.log("connect");
-    if (!connected) {
-        try {
-            var client = new XMLHttpRequest();
-            client.open('GET', 'msg');
-            client.send();
-            // document.getElementById("last_update").innerHTML = 'Connected';
-            client.onprogress = function () {
-                console.log("onprogress");
-                newtimer(disconnect);
-
-                // use only last dict:
-                let new_msg = this.responseText.slice(this.responseText.lastIndexOf("{"));
-                console.log(new_msg);
-                data = JSON.parse(new_msg);
+    let source = new EventSource('msg');
+    seq = null;
+    source.onopen = function () {
+        connected = true;
+    };
+    source.onmessage = function (event) {
+        if (update(JSON.parse(event.data)) === false) {
+            // reconnect to get a new snapshot
+            source.close();
+            connect();
+            return;
+        }
 
-                let nodes = $(".node").children("polygon");
-                nodes.each(function (n) {
-                    var col = "#eeeeee";
-                    if (this.parentElement.id in data) {
-                        col = data[this.parentElement.id];
-                    }
-                    this.setAttribute("fill", col);
-                });
+        const d = new Date();
+        document.getElementById("last_update").innerHTML = 'Last update: ' + d.toLocaleTimeString();
 
-                const d = new Date();
-                document.getElementById("last_update").innerHTML = 'Last update: ' + d.toLocaleTimeString();
+        connected = true;
+    };
+    source.onerror = function (e) {
+        console.log(e);
+        disconnect();
+    };
+}
 
-                connected = true;
-            }
-        } catch (e) {
-            console.log(e);
-            disconnect();
-        }
+function panzoom(element) {
+    // pan by dragging and zoom around the mouse with the wheel
+    let x = 0;
+    let y = 0;
+    let scale = 1;
+    let drag = null;
+    element.style.transformOrigin = "0 0";
+    function apply() {
+        element.style.transform = `translate(${x}px, ${y}px) scale(${scale})`;
     }
+    element.addEventListener("wheel", function (e) {
+        e.preventDefault();
+        const rect = element.getBoundingClientRect();
+        const factor = Math.exp(-e.deltaY * 0.002);
+        x += (e.clientX - rect.left) * (1 - factor);
+        y += (e.clientY - rect.top) * (1 - factor);
+        scale *= factor;
+        apply();
+    }, { passive: false });
+    element.addEventListener("pointerdown", function (e) {
+        drag = { x: e.clientX - x, y: e.clientY - y };
+        element.setPointerCapture(e.pointerId);
+    });
+    element.addEventListener("pointermove", function (e) {
+        if (drag !== null) {
+            x = e.clientX - drag.x;
+            y = e.clientY - drag.y;
+            apply();
+        }
+    });
+    element.addEventListener("pointerup", function () {
+        drag = null;
+    });
 }
 
-$("svg").ready(function () {
-    // use panzoom
-    var element = document.querySelector('svg');
-    panzoom(element, {
-        bounds: true,
-        boundsPadding: 0.1
+document.addEventListener("DOMContentLoaded", function () {
+    let svg = document.querySelector("svg");
+    panzoom(svg);
+    svg.querySelectorAll(".node > image").forEach(function (image) {
+        image.style.display = "none";
     });
-});
-
-$("svg").ready(function () {
     connect();
-
     console.log("done");
-    $(".node").children("image").hide();
-    var width = getWidth($(".node:first").children("polygon").attr("points"));
 });
@@ -0,0 +1,82 @@
+"""Tests for the bt_live.hub module."""
+import asyncio
+import json
+import unittest
+
+from bt_live.hub import BroadcastHub, STATE_COLORS
+from bt_live.store import LiveStateStore, UNKNOWN_STATE
+
+from btlib.common import NODE_STATE
+
+RUNNING = NODE_STATE.RUNNING.value
+SUCCESS = NODE_STATE.SUCCESS.value
+
+
+class UnittestHub(unittest.IsolatedAsyncioTestCase):
+    """Tests for the bt_live.hub module."""
+
+    def setUp(self):
+        self.hub = BroadcastHub(LiveStateStore([1, 2, 3]), queue_size=2)
+
+    async def _publish(self, states, timestamp):
+        """Publish from another thread, like the ROS node does."""
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.hub.publish, states, timestamp)
+
+    async def _get(self, queue):
+        return json.loads(await asyncio.wait_for(queue.get(), 1.))
+
+    async def test_fan_out(self):
+        """A client that keeps up gets every delta in sequence."""
+        queue = self.hub.subscribe()
+        snapshot = await self._get(queue)
+        self.assertEqual(snapshot, {
+            'seq': 0,
+            'timestamp': 0,
+            'full': True,
+            'colors': STATE_COLORS,
+            'uids': [1, 2, 3],
+            'states': [UNKNOWN_STATE] * 3,
+        })
+
+        await self._publish({1: RUNNING}, 10)
+        self.assertEqual(await self._get(queue), {
+            'seq': 1, 'timestamp': 10, 'uids': [1], 'states': [RUNNING]})
+        # without changes nothing is sent
+        await self._publish({1: RUNNING, 42: SUCCESS}, 11)
+        await self._publish({1: SUCCESS, 3: RUNNING}, 12)
+        self.assertEqual(await self._get(queue), {
+            'seq': 2, 'timestamp': 12, 'uids': [1, 3],
+            'states': [SUCCESS, RUNNING]})
+        self.assertTrue(queue.empty())
+
+        self.hub.unsubscribe(queue)
+        await self._publish({2: RUNNING}, 13)
+        await asyncio.sleep(0)
+        self.assertTrue(queue.empty())
+
+    async def test_resync_slow_client(self):
+        """A client with a full queue gets the full state instead."""
+        fast = self.hub.subscribe()
+        slow = self.hub.subscribe()
+        await self._get(fast)
+        # the slow client does not read, its queue starts with the snapshot
+        for seq, states in enumerate(
+                [{1: RUNNING}, {2: RUNNING}, {3: SUCCESS}], start=1):
+            await self._publish(states, 9 + seq)
+            delta = await self._get(fast)
+            self.assertEqual(delta['seq'], seq)
+            self.assertNotIn('full', delta)
+
+        # the queue was full at the second delta, which was replaced with
+        # the snapshot of its version, the third delta follows it
+        resync = await self._get(slow)
+        self.assertTrue(resync['full'])
+        self.assertEqual(resync['seq'], 2)
+        self.assertEqual(resync['timestamp'], 11)
+        self.assertEqual(
+            resync['states'], [RUNNING, RUNNING, UNKNOWN_STATE])
+        delta = await self._get(slow)
+        self.assertEqual(delta, {
+            'seq': 3, 'timestamp': 12, 'uids': [3], 'states': [SUCCESS]})
+        self.assertTrue(slow.empty())
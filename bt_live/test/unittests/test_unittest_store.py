@@ -0,0 +1,95 @@
+"""Tests for the bt_live.store module."""
+import unittest
+
+from bt_live.store import LiveStateStore, UNKNOWN_STATE
+
+from btlib.coalesce import Coalescer
+from btlib.common import NODE_STATE
+
+RUNNING = NODE_STATE.RUNNING.value
+SUCCESS = NODE_STATE.SUCCESS.value
+FAILURE = NODE_STATE.FAILURE.value
+
+
+class UnittestStore(unittest.TestCase):
+    """Tests for the bt_live.store module."""
+
+    def setUp(self):
+        self.store = LiveStateStore([3, 1, 2])
+
+    def test_initial_snapshot(self):
+        """All nodes start in the unknown state without transitions."""
+        snapshot = self.store.snapshot
+        self.assertEqual(snapshot.version, 0)
+        self.assertEqual(snapshot.timestamp, 0)
+        self.assertEqual(snapshot.states.tolist(), [UNKNOWN_STATE] * 3)
+        self.assertEqual(snapshot.transitions.tolist(), [0, 0, 0])
+
+    def test_update(self):
+        """Only changes create a new version, unknown uids are ignored."""
+        changed = self.store.update({1: RUNNING, 2: UNKNOWN_STATE, 42: 1}, 10)
+        self.assertEqual(changed, {1: RUNNING})
+        snapshot = self.store.snapshot
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual(snapshot.timestamp, 10)
+        # the arrays are in the order of the uids of the store
+        self.assertEqual(
+            snapshot.states.tolist(), [UNKNOWN_STATE, RUNNING, UNKNOWN_STATE])
+        self.assertEqual(snapshot.transitions.tolist(), [0, 1, 0])
+
+        # the same states again are no change
+        self.assertEqual(self.store.update({1: RUNNING}, 11), {})
+        self.assertIs(self.store.snapshot, snapshot)
+
+        self.assertEqual(
+            self.store.update({1: SUCCESS, 3: FAILURE}, 12),
+            {1: SUCCESS, 3: FAILURE})
+        self.assertEqual(self.store.snapshot.version, 2)
+        self.assertEqual(self.store.to_dict(self.store.snapshot), {
+            'version': 2,
+            'timestamp': 12,
+            'states': {3: FAILURE, 1: SUCCESS, 2: UNKNOWN_STATE},
+            'transitions': {3: 1, 1: 2, 2: 0},
+        })
+
+    def test_snapshot_immutable(self):
+        """Snapshots are read-only and do not change with updates."""
+        self.store.update({1: RUNNING}, 10)
+        snapshot = self.store.snapshot
+        with self.assertRaises(ValueError):
+            snapshot.states[0] = SUCCESS
+        with self.assertRaises(ValueError):
+            snapshot.transitions[0] = 1
+        self.store.update({1: SUCCESS, 2: RUNNING}, 11)
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual(
+            snapshot.states.tolist(), [UNKNOWN_STATE, RUNNING, UNKNOWN_STATE])
+        self.assertEqual(snapshot.transitions.tolist(), [0, 1, 0])
+
+    def test_transitions_before_coalescing(self):
+        """Every received event counts, also the ones merged into a frame."""
+        coalescer = Coalescer()
+        for uid, state in [
+                (1, RUNNING), (1, SUCCESS), (1, RUNNING), (2, RUNNING),
+                (42, SUCCESS)]:
+            coalescer.add({uid: state})
+        frame = coalescer.flush()
+        changed = self.store.update(frame.states, 10, frame.transitions)
+        self.assertEqual(changed, {1: RUNNING, 2: RUNNING})
+        self.assertEqual(self.store.snapshot.transitions.tolist(), [0, 3, 1])
+
+        # a node that is back in its state still counts its transitions
+        coalescer.add({1: SUCCESS})
+        coalescer.add({1: RUNNING})
+        frame = coalescer.flush()
+        self.assertEqual(
+            self.store.update(frame.states, 11, frame.transitions), {})
+        snapshot = self.store.snapshot
+        self.assertEqual(snapshot.version, 2)
+        self.assertEqual(snapshot.timestamp, 11)
+        self.assertEqual(snapshot.transitions.tolist(), [0, 5, 1])
+
+        # without counts, each changed node counts one transition
+        self.store.update({1: SUCCESS, 2: RUNNING}, 12)
+        self.assertEqual(
+            self.store.snapshot.transitions.tolist(), [0, 6, 1])
@@ -13,7 +13,11 @@
 # limitations under the License.
 
 from bt_view.bt_view import draw_pygraphviz_w_colorvalues
+from bt_view.svg_template import has_png_support, SvgTemplate
+from btlib import VALUE_MAP_COLORS
 from btlib.bts import fbl_to_networkx
+from btlib.cache import atomic_write
+from btlib.coalesce import Coalescer, DEFAULT_RATE_HZ
 from btlib.common import NODE_STATE
 from nav2_msgs.msg import BehaviorTreeLog
 from nav2_msgs.msg import BehaviorTreeStatusChange
@@ -58,17 +62,31 @@ class Listener(Node):
         self.img_path = self.param_img_path.value
         self.get_logger().info(f'img_path: {self.img_path}')
 
+        self.param_max_rate = self.declare_parameter(
+            'max_rate',
+            DEFAULT_RATE_HZ,
+            ParameterDescriptor(
+                description='Maximum number of images drawn per second.'))
+        # all changes within one frame are drawn at once
+        self.coalescer = Coalescer(self.param_max_rate.value)
+        self.timer = self.create_timer(
+            self.coalescer.period_s, self.timer_callback)
+
         self.g = fbl_to_networkx(self.fbl_path)
         # gray by default
         self.empty_valuemap = {n: '#DDDDDD' for n in self.g.nodes}
         self.get_logger().info(f'{self.empty_valuemap=}')
+        # the tree is laid out once, updates only change the colors
+        self.template = SvgTemplate.from_graph(self.g, '#DDDDDD')
+        if not has_png_support():
+            self.get_logger().warning(
+                'cairosvg is not installed, png images are rendered by '
+                'graphviz, which is slower.')
 
     def listener_callback(self, msg: BehaviorTreeLog):
         event_log = msg.event_log
         self.get_logger().info(
             f'Received an BT log message with {len(event_log)} events')
-        value_map = self.empty_valuemap.copy()
-        changed = False
         for event in event_log:
             assert isinstance(event, BehaviorTreeStatusChange)
             if _has_uid(event):
@@ -77,22 +95,44 @@ class Listener(Node):
                     f'(No {event.uid}) '
                     f'changed status to {event.current_status}.')
                 if event.current_status == NODE_STATE.SUCCESS.name:
-                    value_map[event.uid] = '#00FF00'
+                    color = '#00FF00'
                 elif event.current_status == NODE_STATE.FAILURE.name:
-                    value_map[event.uid] = '#FF0000'
+                    color = '#FF0000'
                 elif event.current_status == NODE_STATE.RUNNING.name:
-                    value_map[event.uid] = '#FFFF00'
-                changed = True
+                    color = '#FFFF00'
+                else:
+                    color = '#DDDDDD'
+                # one event at a time, so that repeated changes of a node
+                # within this message are counted as dropped
+                self.coalescer.add({event.uid: color})
             else:
                 self.get_logger().info(
                     f'  Node {event.node_name} '
                     f'changed status to {event.current_status}.')
-        if changed:
+
+    def timer_callback(self):
+        frame = self.coalescer.flush()
+        if not frame.states:
+            return
+        if frame.dropped:
+            self.get_logger().info(
+                f'Skipped {frame.dropped} state changes to keep the '
+                'frame rate.')
+        value_map = self.empty_valuemap.copy()
+        value_map.update(frame.states)
+        self._draw(value_map)
+
+    def _draw(self, value_map: VALUE_MAP_COLORS):
+        if has_png_support():
+            atomic_write(
+                f'{self.img_path}.svg', self.template.render(value_map))
+            atomic_write(
+                f'{self.img_path}.png', self.template.render_png(value_map))
+        else:
             draw_pygraphviz_w_colorvalues(
                 self.g,
                 self.img_path,
                 value_map)
-        self.get_logger().info(f'{value_map=}')
 
 
 def main(args=None):
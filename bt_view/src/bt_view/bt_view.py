@@ -12,22 +12,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import ChainMap, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 from hashlib import sha256
-from math import log
+import io
+import json
 import os
 import tempfile
-from typing import Dict, List, Optional, Union
+from typing import (Any, Callable, Dict, List, Mapping, Optional, Sequence,
+                    Tuple, Union)
 
 from btlib import VALUE_MAP
 from btlib import VALUE_MAP_COLORS
 from btlib import VALUE_MAP_RETURN_STATES
 from btlib.bts import NAME
+from btlib.cache import atomic_write, evict_lru, get_cache_dir, touch
 from btlib.common import NODE_STATE
-import matplotlib as mpl
-import matplotlib.colors as colors
-import matplotlib.pyplot as plt
+from btlib.stats import NodeStats
 import networkx as nx
-from PIL import Image, ImageColor
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+import pygraphviz as pgv
 
 
 WIDTH = 1920
@@ -36,9 +42,47 @@ HEIGHT = 1080
 BG_IMG_FOLDER = os.path.join(
     tempfile.gettempdir(),
     'bt_imgs')
+BG_IMG_FOLDER_MAX_BYTES = 1 << 28
+# minimum size of the nodes
 NODE_WIDTH_IN = 2.5
 NODE_HEIGHT_IN = 0.8
+# the size of a node only depends on the tree (see `_get_node_size`), so
+# that all views of a tree share one layout. Values of a view get one line
+# of `VALUE_SLOT_CHARS` characters, longer values overflow the node.
+NAME_CHAR_IN = 0.115
+TEXT_CHAR_IN = 0.105
+NAME_LINE_IN = 0.35
+TEXT_LINE_IN = 0.15
+LABEL_MARGIN_IN = 0.25
+VALUE_SLOT_CHARS = 32
 DPI = 150
+# size of the return state bar graphs
+BARGRAPH_WIDTH_PX = 330
+BARGRAPH_HEIGHT_PX = 75
+
+# graphviz format and file extension per output format
+OUTPUT_FORMATS: Dict[str, Tuple[str, str]] = {
+    'svg': ('svg', 'svg'),
+    'png': ('png', 'png'),
+    'pdf': ('pdf', 'pdf'),
+    # positions of all nodes and edges
+    'json-layout': ('json', 'json'),
+}
+DEFAULT_FORMATS = ('svg', 'png')
+
+# folder of the cached layouts, `None` for `layouts` in `get_cache_dir()`
+LAYOUT_FOLDER: Optional[str] = None
+LAYOUT_FOLDER_MAX_BYTES = 1 << 26
+# number of layouts that are kept in memory
+LAYOUT_CACHE_SIZE = 32
+# node attributes that change the size of a node and therefore the layout
+LAYOUT_NODE_ATTRS = ['shape', 'width', 'height', 'fixedsize']
+# node attributes that also change the size if it is not fixed
+LAYOUT_CONTENT_ATTRS = ['label', 'fontname', 'image']
+LAYOUT = Dict[str, Any]
+# additional node attributes to show in the labels, per node
+OVERLAY = Dict[int, Dict[str, Any]]
+_layouts: 'OrderedDict[str, LAYOUT]' = OrderedDict()
 
 L = '99'
 M = 'CC'
@@ -56,31 +100,84 @@ COLORS_PER_RETURN_STATE_VALUE = {
     for rs in NODE_STATE
 }
 COLORS_PER_RETURN_STATE_VALUE[None] = COLORS_PER_RETURN_STATE[None]
+# colors of colormaps that are used without matplotlib (from colorbrewer2)
+COLORMAP_ANCHORS = {
+    'RdYlGn': [
+        'a50026', 'd73027', 'f46d43', 'fdae61', 'fee08b', 'ffffbf',
+        'd9ef8b', 'a6d96a', '66bd63', '1a9850', '006837'],
+}
+COLORMAP_LUT_SIZE = 256
+# color per state value of the history images, 0 is for missing states
+HISTORY_LUT = np.array([
+    ImageColor.getrgb(COLORS_PER_RETURN_STATE_VALUE[value])
+    for value in [None] + sorted(rs.value for rs in NODE_STATE)
+], dtype=np.uint8)
+# palette of the bar graphs, white background and one color per state
+BARGRAPH_PALETTE = [255, 255, 255]
+for state in NODE_STATE:
+    BARGRAPH_PALETTE.extend(ImageColor.getrgb(COLORS_PER_RETURN_STATE[state]))
 
 
 def my_hash(s: object) -> str:
     return sha256(str(s).encode()).hexdigest()[:20]
 
 
-def _colormap(cm_name: str, value: Optional[float]) -> str:
-    if value is None:
-        # grey for missing values
-        return GRAY
+def _get_colormap_anchors(cm_name: str) -> np.ndarray:
+    """Get the colors of a colormap as RGB values between 0 and 1."""
+    if cm_name in COLORMAP_ANCHORS:
+        return np.array([
+            ImageColor.getrgb(f'#{color}')
+            for color in COLORMAP_ANCHORS[cm_name]]) / 255
+    # matplotlib is slow to import and only needed for other colormaps
+    import matplotlib as mpl
     try:
         cmap = mpl.colormaps[cm_name]
     except AttributeError:
         cmap = mpl.cm.get_cmap(cm_name)
-    norm = colors.Normalize(vmin=0, vmax=1)
-    rgba = cmap(norm(value))
+    return cmap(np.linspace(0, 1, COLORMAP_LUT_SIZE))[:, :3]
+
+
+@lru_cache(maxsize=None)
+def _get_colormap_lut(cm_name: str) -> List[str]:
+    """Get the brightened hex colors of a colormap for each LUT entry."""
+    anchors = _get_colormap_anchors(cm_name)
+    x_anchors = np.linspace(0, 1, len(anchors))
+    x_lut = np.linspace(0, 1, COLORMAP_LUT_SIZE)
+    rgb = np.stack([
+        np.interp(x_lut, x_anchors, anchors[:, i_channel])
+        for i_channel in range(3)], axis=1)
     # make color brighter
-    rgba = (rgba[0] * 0.5 + 0.5,
-            rgba[1] * 0.5 + 0.5,
-            rgba[2] * 0.5 + 0.5, 1)
-    return f'#{int(rgba[0] * 255):02x}'\
-        f'{int(rgba[1] * 255):02x}{int(rgba[2] * 255):02x}'
+    rgb = ((rgb * 0.5 + 0.5) * 255).astype(int)
+    return [f'#{r:02x}{g:02x}{b:02x}' for r, g, b in rgb.tolist()]
+
+
+def _colormap_values(cm_name: str, values: np.ndarray) -> List[str]:
+    """
+    Get the colors of values between 0 and 1.
+
+    :param cm_name: Name of the colormap, e.g. `RdYlGn`.
+    :param values: The values, `nan` for missing values, which are gray.
+    :return: The hex color per value.
+    """
+    lut = _get_colormap_lut(cm_name)
+    indices = values * COLORMAP_LUT_SIZE
+    indices[indices == COLORMAP_LUT_SIZE] = COLORMAP_LUT_SIZE - 1
+    indices = np.clip(
+        np.nan_to_num(indices, nan=0.), 0, COLORMAP_LUT_SIZE - 1
+    ).astype(int)
+    return [
+        GRAY if missing else lut[i]
+        for i, missing in zip(indices.tolist(), np.isnan(values).tolist())]
+
+
+def _colormap(cm_name: str, value: Optional[float]) -> str:
+    if value is None:
+        # grey for missing values
+        return GRAY
+    return _colormap_values(cm_name, np.array([value], dtype=float))[0]
 
 
-def format_label(attrs: Dict[str, str]) -> str:
+def format_label(attrs: Mapping[str, Any]) -> str:
     label = f'<b>{attrs[NAME]}</b>'
     attributes = sorted(attrs.keys())
     for attr in attributes:
@@ -90,99 +187,173 @@ def format_label(attrs: Dict[str, str]) -> str:
     return f'<{label}>'
 
 
-def _plus_minus_log(x):
-    if x == 0:
-        return 0
-    elif x > 0:
-        return log(x + 1)
-    else:  # x < 0
-        return -log(-x + 1)
+def _log_normalize_array(
+    values: np.ndarray,
+    vmin=0.,
+    vmax=1.
+) -> np.ndarray:
+    """
+    Log-scale values and normalize them to [vmin, vmax].
+
+    The center of the range, (vmax + vmin) / 2, stays at zero. Missing
+    values are `nan` and stay `nan`.
+    """
+    # take log to make small values more visible
+    values_log = np.sign(values) * np.log(np.abs(values) + 1.)
+    abs_max = np.max(
+        np.abs(values_log), initial=0., where=~np.isnan(values_log))
+    center = (vmax + vmin) / 2
+    if abs_max > 0:
+        values_log *= 1 / abs_max * (vmax - vmin) / 2
+    values_log += center
+    return values_log
+
+
+def _log_normalize_stats(
+    stats: NodeStats,
+    vmin=0.,
+    vmax=1.
+) -> VALUE_MAP_RETURN_STATES:
+    never_ticked = stats.never_ticked
+    counts = stats.counts.astype(float)
+    counts[never_ticked] = np.nan
+    counts_log = _log_normalize_array(counts, vmin, vmax)
+    return {
+        uid: None if missing else values
+        for uid, missing, values in zip(
+            stats.uids.tolist(),
+            never_ticked.tolist(),
+            counts_log.tolist())}
 
 
 def _log_normalize(
-    values: Union[VALUE_MAP, VALUE_MAP_RETURN_STATES],
+    values: Union[VALUE_MAP, VALUE_MAP_RETURN_STATES, NodeStats],
     vmin=0.,
     vmax=1.
 ) -> Union[VALUE_MAP, VALUE_MAP_RETURN_STATES]:
-    ret_values = values.copy()
-    # take log to make small values more visible
-    min_value = 1E10
-    max_value = -1E10
-    values_log = {}
+    if isinstance(values, NodeStats):
+        return _log_normalize_stats(values, vmin, vmax)
+    # flatten all values into one array, lists have their length as size
+    flat_values: List[float] = []
+    sizes: Dict[int, Optional[int]] = {}
     for k, v in values.items():
         if v is None:
-            continue
+            sizes[k] = None
         elif isinstance(v, int) or isinstance(v, float):
-            values_log[k] = _plus_minus_log(v)
-            min_value = min(values_log[k], min_value)
-            max_value = max(values_log[k], max_value)
+            flat_values.append(v)
+            sizes[k] = 0
         elif isinstance(v, list):
-            values_log[k] = [_plus_minus_log(x) for x in v]
-            min_value = min(min(values_log[k]), min_value)
-            max_value = max(max(values_log[k]), max_value)
+            flat_values.extend(v)
+            sizes[k] = len(v)
         else:
             raise ValueError(f'Unknown value type: {type(v)}')
-    abs_max = max(abs(min_value), abs(max_value))
-    # normalize to [vmin, vmax] with (vmax + vmin) / 2 as center
-    center = (vmax + vmin) / 2
-    scale = 1 / abs_max * (vmax - vmin) / 2
-    for k, v in values_log.items():
-        if isinstance(v, int) or isinstance(v, float):
-            ret_values[k] = v * scale + center
-        elif isinstance(v, list):
-            ret_values[k] = [x * scale + center for x in v]  # type: ignore
+    values_log = _log_normalize_array(
+        np.array(flat_values, dtype=float), vmin, vmax).tolist()
+    ret_values: Dict[int, Any] = {}
+    i_value = 0
+    for k, size in sizes.items():
+        if size is None:
+            ret_values[k] = None
+        elif size == 0:
+            ret_values[k] = values_log[i_value]
+            i_value += 1
+        else:
+            ret_values[k] = values_log[i_value:i_value + size]
+            i_value += size
     return ret_values
 
 
+def _is_cached(img_path: str) -> bool:
+    """
+    Check if an image is in the cache and mark it as recently used.
+
+    Images are named by the hash of their content, so they can be shared
+    by all renders, also of concurrent processes.
+    """
+    os.makedirs(os.path.dirname(img_path), exist_ok=True)
+    if os.path.exists(img_path):
+        touch(img_path)
+        return True
+    return False
+
+
+def _evict_images():
+    """Remove the least recently used images if the cache is too large."""
+    if os.path.isdir(BG_IMG_FOLDER):
+        evict_lru(BG_IMG_FOLDER, BG_IMG_FOLDER_MAX_BYTES)
+
+
 def _make_return_value_bargraph(
         retvalues_counts: Optional[List[float]],
-        max_count: int):
+        max_count: int,
+        img_folder: Optional[str] = None):
     if retvalues_counts is None:
         return None
-    if not os.path.exists(BG_IMG_FOLDER):
-        os.makedirs(BG_IMG_FOLDER)
     img_hash = my_hash(tuple(retvalues_counts))
     img_path = os.path.join(
-        BG_IMG_FOLDER,
-        f'{img_hash}.png')
-    if os.path.exists(img_path):
+        img_folder or BG_IMG_FOLDER,
+        f'b{img_hash}.png')
+    if _is_cached(img_path):
         return img_path
-    plt.figure(figsize=(NODE_WIDTH_IN, NODE_HEIGHT_IN), dpi=DPI)
-    plt.axis('off')
-    plt.bar(
-        x=range(len(retvalues_counts)),
-        height=retvalues_counts,
-        width=1,
-        color=[COLORS_PER_RETURN_STATE[i] for i in NODE_STATE],
-        align='edge',
-    )
-    plt.xlim(0, len(retvalues_counts))
-    plt.ylim(0, max_count)
-    plt.tight_layout()
-    plt.savefig(img_path, bbox_inches='tight', pad_inches=0)
-    plt.close()
+    img = Image.new('P', (BARGRAPH_WIDTH_PX, BARGRAPH_HEIGHT_PX), color=0)
+    img.putpalette(BARGRAPH_PALETTE)
+    draw = ImageDraw.Draw(img)
+    n_bars = len(retvalues_counts)
+    for i_bar, count in enumerate(retvalues_counts):
+        height = min(max(count / max_count, 0.), 1.)
+        bar_height_px = round(height * BARGRAPH_HEIGHT_PX)
+        if bar_height_px == 0:
+            continue
+        draw.rectangle(
+            (
+                round(i_bar * BARGRAPH_WIDTH_PX / n_bars),
+                BARGRAPH_HEIGHT_PX - bar_height_px,
+                round((i_bar + 1) * BARGRAPH_WIDTH_PX / n_bars) - 1,
+                BARGRAPH_HEIGHT_PX - 1,
+            ),
+            fill=i_bar + 1)
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='png', dpi=(DPI, DPI))
+    atomic_write(img_path, img_bytes.getvalue())
     return img_path
 
 
+def _get_history_columns(states: np.ndarray, width_px: int) -> np.ndarray:
+    """
+    Shorten a history of state values to at most `width_px` columns.
+
+    Longer histories are split into `width_px` equal parts and each column
+    shows the state that is most frequent in its part.
+    """
+    n_states = len(states)
+    if n_states <= width_px:
+        return states
+    columns = np.arange(n_states) * width_px // n_states
+    counts = np.bincount(
+        columns * len(HISTORY_LUT) + states,
+        minlength=width_px * len(HISTORY_LUT))
+    return counts.reshape(width_px, len(HISTORY_LUT)).argmax(
+        axis=1).astype(np.uint8)
+
+
 def _make_history_image(
-        states: Optional[List[int]]):
+        states: Optional[Union[List[Optional[int]], np.ndarray]],
+        img_folder: Optional[str] = None):
     if states is None:
         return None
-    if not os.path.exists(BG_IMG_FOLDER):
-        os.makedirs(BG_IMG_FOLDER)
-    img_hash = my_hash(tuple(states))
+    # missing states (`None`) become 0, which is gray in the lookup table
+    state_values = np.nan_to_num(
+        np.asarray(states, dtype=float), nan=0.).astype(np.uint8)
+    img_hash = my_hash(state_values.tobytes())
     img_path = os.path.join(
-        BG_IMG_FOLDER,
+        img_folder or BG_IMG_FOLDER,
         f'h{img_hash}.png')
-    if os.path.exists(img_path):
+    if _is_cached(img_path):
         return img_path
     width_px = int(NODE_WIDTH_IN * DPI)
     height_px = int(NODE_HEIGHT_IN * DPI)
-    img = Image.new('RGB', (len(states), 1), color=(255, 255, 255))
-    for i, state in enumerate(states):
-        color = ImageColor.getrgb(
-            COLORS_PER_RETURN_STATE_VALUE[state])
-        img.putpixel((i, 0), color)
+    columns = _get_history_columns(state_values, width_px)
+    img = Image.fromarray(HISTORY_LUT[columns][np.newaxis])
     try:
         img = img.resize(
             (width_px, height_px),
@@ -191,56 +362,238 @@ def _make_history_image(
         img = img.resize(
             (width_px, height_px),
             resample=Image.NEAREST)
-    img.save(img_path)
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='png')
+    atomic_write(img_path, img_bytes.getvalue())
     return img_path
 
 
-def draw_pygraphviz(
+def _get_layout_key(A: pgv.AGraph) -> str:
+    """
+    Hash everything in the graph that has an effect on the layout.
+
+    These are the structure of the graph and the geometry of the nodes.
+    The labels and images of nodes with a fixed size do not change the
+    layout, so the views of a tree and all logs of it share one layout.
+    """
+    nodes = []
+    for node in A.nodes():
+        attrs = [node.attr[attr] for attr in LAYOUT_NODE_ATTRS]
+        if node.attr['fixedsize'] != 'true':
+            attrs.extend(node.attr[attr] for attr in LAYOUT_CONTENT_ATTRS)
+        nodes.append((str(node), attrs))
+    edges = [(str(u), str(v)) for u, v in A.edges()]
+    return my_hash((nodes, edges))
+
+
+def _make_layout(A: pgv.AGraph) -> LAYOUT:
+    A.layout(prog='dot', args='-Gordering=out')
+    return {
+        'bb': A.graph_attr['bb'],
+        'nodes': {str(node): node.attr['pos'] for node in A.nodes()},
+        'edges': [
+            [str(edge[0]), str(edge[1]), edge.attr['pos']]
+            for edge in A.edges()],
+    }
+
+
+def _get_layout_folder() -> str:
+    if LAYOUT_FOLDER is not None:
+        return LAYOUT_FOLDER
+    return os.path.join(get_cache_dir(), 'layouts')
+
+
+def get_layout(A: pgv.AGraph) -> LAYOUT:
+    """
+    Get the positions of nodes and edges of the graph.
+
+    The `dot` layout is only computed if there is no layout of an identical
+    graph yet. Changes of the colors or other styles of the nodes, and of
+    the labels and images of nodes with a fixed size, do not require a new
+    layout. Layouts are kept in memory and in the folder from
+    `_get_layout_folder`.
+
+    :param A: The graph to lay out. It is not modified.
+    :return: The bounding box and the positions of nodes and edges.
+    """
+    key = _get_layout_key(A)
+    if key in _layouts:
+        _layouts.move_to_end(key)
+        return _layouts[key]
+    layout_folder = _get_layout_folder()
+    path = os.path.join(layout_folder, f'{key}.json')
+    try:
+        with open(path, 'r') as f:
+            layout = json.load(f)
+        touch(path)
+    except (FileNotFoundError, ValueError):
+        layout = _make_layout(pgv.AGraph(A.string()))
+        os.makedirs(layout_folder, exist_ok=True)
+        atomic_write(path, json.dumps(layout).encode())
+        evict_lru(layout_folder, LAYOUT_FOLDER_MAX_BYTES)
+    _layouts[key] = layout
+    if len(_layouts) > LAYOUT_CACHE_SIZE:
+        _layouts.popitem(last=False)
+    return layout
+
+
+def _apply_layout(A: pgv.AGraph, layout: LAYOUT):
+    A.graph_attr['bb'] = layout['bb']
+    for node in A.nodes():
+        node.attr['pos'] = layout['nodes'][str(node)]
+    for u, v, pos in layout['edges']:
+        A.get_edge(u, v).attr['pos'] = pos
+    A.has_layout = True
+
+
+def _get_node_size(attrs: Mapping[str, Any]) -> Tuple[float, float]:
+    """
+    Get the size of a node that fits its label, in inches.
+
+    Only the attributes of the tree are used. The values of a view (see
+    `OVERLAY`) get a reserved line instead, so that the size is the same in
+    all views.
+
+    :param attrs: Attributes of the node in the tree.
+    :return: Width and height.
+    """
+    line_widths = [len(str(attrs[NAME])) * NAME_CHAR_IN] + [
+        len(f'{attr}: {value}') * TEXT_CHAR_IN
+        for attr, value in attrs.items() if attr != NAME] + [
+        VALUE_SLOT_CHARS * TEXT_CHAR_IN]
+    width = max(NODE_WIDTH_IN, max(line_widths) + LABEL_MARGIN_IN)
+    height = max(
+        NODE_HEIGHT_IN, NAME_LINE_IN + (len(line_widths) - 1) * TEXT_LINE_IN)
+    return round(width, 2), round(height, 2)
+
+
+def to_agraph(
     g: nx.Graph,
-    fname: str,
     modifier,
-):
+    overlay: Optional[OVERLAY] = None,
+) -> pgv.AGraph:
+    """
+    Convert the graph to a graphviz graph with the layout applied.
+
+    :param g: The behavior tree. It is not modified.
+    :param modifier: Optional function that changes the attributes of each
+        graphviz node.
+    :param overlay: Optional attributes per node that are shown in the
+        labels in addition to the attributes of `g`.
+    :return: The graphviz graph, ready to be drawn.
+    """
     A = nx.nx_agraph.to_agraph(g)  # convert to a graphviz graph
     for node in A.nodes():
         # for node attributes see https://graphviz.org/docs/nodes/
         node.attr['id'] = node
         node.attr['shape'] = 'box'
         node.attr['fontname'] = 'Bitstream Vera Sans Mono'
-        node.attr['label'] = format_label(g.nodes[int(node)])
-        node.attr['width'] = str(NODE_WIDTH_IN)
-        node.attr['height'] = str(NODE_HEIGHT_IN)
+        attrs: Mapping[str, Any] = g.nodes[int(node)]
+        if overlay is not None and int(node) in overlay:
+            attrs = ChainMap(overlay[int(node)], attrs)  # type: ignore
+        node.attr['label'] = format_label(attrs)
+        width, height = _get_node_size(g.nodes[int(node)])
+        node.attr['width'] = str(width)
+        node.attr['height'] = str(height)
+        # the size does not depend on the values in the label and images
+        node.attr['fixedsize'] = 'true'
+        node.attr['imagescale'] = 'both'
         if modifier is not None:
             modifier(node)
     # remove labels from edges
     for edge in A.edges():
         edge.attr['label'] = ''
-    for ext in ['svg', 'png']:
-        A.draw(
-            f'{fname}.{ext}',
-            prog='dot',
-            # ordering of the outedges
-            args='-Gordering=out'
-        )
+    _apply_layout(A, get_layout(A))
+    return A
+
+
+def _get_values_key(values: Union[List, np.ndarray]) -> Any:
+    if isinstance(values, np.ndarray):
+        return values.tobytes()
+    return tuple(values)
+
+
+def _make_images(
+    make_image: Callable[..., Optional[str]],
+    values: VALUE_MAP_RETURN_STATES,
+    jobs: int,
+) -> Dict[int, Optional[str]]:
+    """
+    Make the images of all nodes before drawing the graph.
+
+    Nodes with the same values share an image, which is only made once.
+    The worker processes do not share the state of this module (e.g. with
+    the `spawn` start method), so the image folder is passed to them.
+
+    :param make_image: Function that makes the image of one node in the
+        folder given as `img_folder`. It must be picklable.
+    :param values: Values per node, `None` for nodes without an image.
+    :param jobs: Number of processes to make the images in parallel.
+    :return: Image path per node.
+    """
+    make_image = partial(make_image, img_folder=BG_IMG_FOLDER)
+    distinct_values = {
+        _get_values_key(v): v for v in values.values() if v is not None}
+    if jobs > 1 and len(distinct_values) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            img_paths = list(pool.map(make_image, distinct_values.values()))
+    else:
+        img_paths = [make_image(v) for v in distinct_values.values()]
+    img_path_per_value = dict(zip(distinct_values.keys(), img_paths))
+    return {
+        node: None if v is None else img_path_per_value[_get_values_key(v)]
+        for node, v in values.items()}
+
+
+def draw_pygraphviz(
+    g: nx.Graph,
+    fname: str,
+    modifier,
+    formats: Sequence[str] = DEFAULT_FORMATS,
+    overlay: Optional[OVERLAY] = None,
+):
+    """
+    Draw the graph to one file per format, all from the same layout.
+
+    :param g: The behavior tree. It is not modified.
+    :param fname: Path of the output files without extension.
+    :param modifier: Optional function that changes the attributes of each
+        graphviz node.
+    :param formats: Output formats, see `OUTPUT_FORMATS`.
+    :param overlay: Optional attributes per node to show in the labels.
+    """
+    for output_format in formats:
+        assert output_format in OUTPUT_FORMATS, \
+            f'Unknown output format: {output_format}'
+    A = to_agraph(g, modifier, overlay)
+    for output_format in formats:
+        graphviz_format, ext = OUTPUT_FORMATS[output_format]
+        # without `prog`, graphviz only renders the given positions
+        A.draw(f'{fname}.{ext}', format=graphviz_format)
 
 
 def draw_pygraphviz_w_valuemod(
     g: nx.Graph,
     fname: str,
     value_mod: VALUE_MAP,
+    formats: Sequence[str] = DEFAULT_FORMATS,
 ):
-    g = g.copy()
     value_color: VALUE_MAP = _log_normalize(
         value_mod, vmin=0, vmax=1)  # type: ignore
-    for node in g.nodes:
-        g.nodes[node]['value'] = value_mod[node]
+    fillcolors = dict(zip(value_color.keys(), _colormap_values(
+        'RdYlGn',
+        np.array([
+            np.nan if v is None else v
+            for v in value_color.values()], dtype=float))))
     draw_pygraphviz(
         g,
         fname,
         lambda node: node.attr.update(
             style='filled',
-            fillcolor=_colormap('RdYlGn', value_color[int(node)]),
-            label=format_label(g.nodes[int(node)]),
-        )
+            fillcolor=fillcolors[int(node)],
+        ),
+        formats=formats,
+        overlay={node: {'value': value_mod[node]} for node in g.nodes},
     )
 
 
@@ -256,52 +609,54 @@ def _values_to_str(value_states: Optional[List[int]]) -> str:
 def draw_pygraphviz_w_returnstates(
     g: nx.Graph,
     fname: str,
-    value_states: VALUE_MAP_RETURN_STATES
+    value_states: Union[VALUE_MAP_RETURN_STATES, NodeStats],
+    jobs: int = 1,
+    formats: Sequence[str] = DEFAULT_FORMATS,
 ):
-    g = g.copy()
     value_bars = _log_normalize(value_states, -1, 1)
     max_count = 1
-    for node in g.nodes:
-        g.nodes[node]['values'] = _values_to_str(value_states[node])
-    if os.path.exists(BG_IMG_FOLDER):
-        for f in os.listdir(BG_IMG_FOLDER):
-            os.remove(os.path.join(BG_IMG_FOLDER, f))
+    images = _make_images(
+        partial(_make_return_value_bargraph, max_count=max_count),
+        value_bars,  # type: ignore
+        jobs)
 
     def modifier(node):
-        if value_bars[int(node)] is None:
+        if images[int(node)] is None:
             node.attr.update(
                 style='filled',
                 fillcolor='gray',
             )
         else:
             node.attr.update(
-                image=_make_return_value_bargraph(
-                    value_bars[int(node)],
-                    max_count
-                ),
-                label=format_label(g.nodes[int(node)])
+                image=images[int(node)],
             )
 
     draw_pygraphviz(
         g,
         fname,
-        modifier=modifier
+        modifier=modifier,
+        formats=formats,
+        overlay={
+            node: {'values': _values_to_str(value_states[node])}
+            for node in g.nodes},
     )
+    _evict_images()
 
 
 def draw_pygraphviz_w_colorvalues(
     g: nx.Graph,
     fname: str,
-    value_color: VALUE_MAP_COLORS
+    value_color: VALUE_MAP_COLORS,
+    formats: Sequence[str] = DEFAULT_FORMATS,
 ):
-    g = g.copy()
     draw_pygraphviz(
         g,
         fname,
         lambda node: node.attr.update(
             style='filled',
             fillcolor=value_color[int(node)],
-        )
+        ),
+        formats=formats,
     )
 
 
@@ -309,28 +664,26 @@ def draw_pygraphviz_w_history(
     g: nx.Graph,
     fname: str,
     value_history: VALUE_MAP_RETURN_STATES,
+    jobs: int = 1,
+    formats: Sequence[str] = DEFAULT_FORMATS,
 ):
-    g = g.copy()
-    if os.path.exists(BG_IMG_FOLDER):
-        for f in os.listdir(BG_IMG_FOLDER):
-            os.remove(os.path.join(BG_IMG_FOLDER, f))
+    images = _make_images(_make_history_image, value_history, jobs)
 
     def modifier(node):
-        if value_history[int(node)] is None:
+        if images[int(node)] is None:
             node.attr.update(
                 style='filled',
                 fillcolor='gray',
             )
         else:
             node.attr.update(
-                image=_make_history_image(
-                    value_history[int(node)]
-                ),
-                label=format_label(g.nodes[int(node)])
+                image=images[int(node)],
             )
 
     draw_pygraphviz(
         g,
         fname,
-        modifier=modifier
+        modifier=modifier,
+        formats=formats,
     )
+    _evict_images()
@@ -0,0 +1,116 @@
+"""Level of detail for drawing large behavior trees."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from btlib.stats import NodeStats
+import networkx as nx
+
+# node attribute that tells how many nodes are hidden below a node
+COLLAPSED = 'collapsed'
+
+
+def get_root(g: nx.DiGraph) -> int:
+    """Get the root node of the tree."""
+    roots = [node for node, degree in g.in_degree() if degree == 0]
+    assert len(roots) == 1, f'Tree must have one root, found {len(roots)}'
+    return roots[0]
+
+
+def _get_induced_subgraph(g: nx.DiGraph, nodes: Set[int]) -> nx.DiGraph:
+    """
+    Copy a part of the graph, keeping the order of nodes and edges.
+
+    `nx.Graph.subgraph` does not keep the order of the children, which
+    defines the order in which they are drawn.
+    """
+    g_sub = g.__class__()
+    g_sub.graph.update(g.graph)
+    g_sub.add_nodes_from(
+        (node, attrs) for node, attrs in g.nodes(data=True) if node in nodes)
+    g_sub.add_edges_from(
+        (u, v, attrs) for u, v, attrs in g.edges(data=True)
+        if u in nodes and v in nodes)
+    return g_sub
+
+
+def get_subtree(g: nx.DiGraph, root: int) -> nx.DiGraph:
+    """
+    Get the subtree below a node, to draw it in full detail.
+
+    :param g: The behavior tree.
+    :param root: The node that becomes the root of the subtree.
+    :return: A copy of the subtree.
+    """
+    assert root in g, f'Node {root} is not in the tree'
+    return _get_induced_subgraph(g, {root} | nx.descendants(g, root))
+
+
+def _get_subtree_activity(
+    g: nx.DiGraph,
+    stats: NodeStats
+) -> Dict[int, int]:
+    """How often the nodes in the subtree of each node changed state."""
+    totals = dict(zip(stats.uids.tolist(), stats.totals.tolist()))
+    activity: Dict[int, int] = {}
+    for node in reversed(list(nx.topological_sort(g))):
+        activity[node] = totals.get(node, 0) + sum(
+            activity[child] for child in g.successors(node))
+    return activity
+
+
+def collapse_subtrees(
+    g: nx.DiGraph,
+    max_depth: Optional[int] = None,
+    min_activity: Optional[int] = None,
+    stats: Optional[NodeStats] = None,
+) -> Tuple[nx.DiGraph, Dict[int, List[int]]]:
+    """
+    Replace subtrees by their root to reduce the size of the drawing.
+
+    A subtree is collapsed if its root is at `max_depth` or if all its nodes
+    together changed their state less than `min_activity` times. Collapsed
+    nodes get the attribute `COLLAPSED` with the number of hidden nodes.
+    Use `NodeStats.aggregate` with the returned members to get the counts
+    of the whole subtrees.
+
+    :param g: The behavior tree.
+    :param max_depth: Depth below which nodes are hidden, the root is at 0.
+    :param min_activity: Number of state changes a subtree needs to be
+        shown, requires `stats`.
+    :param stats: The state counts of the nodes.
+    :return: The reduced tree and the nodes that each node stands for.
+    """
+    assert min_activity is None or stats is not None, \
+        'Stats are needed to collapse inactive subtrees'
+    activity = {} if stats is None else _get_subtree_activity(g, stats)
+    members: Dict[int, List[int]] = {}
+    todo = [(get_root(g), 0)]
+    while todo:
+        node, depth = todo.pop()
+        children = list(g.successors(node))
+        collapse = len(children) > 0 and (
+            (max_depth is not None and depth >= max_depth) or
+            (min_activity is not None and activity[node] < min_activity))
+        if collapse:
+            members[node] = [node] + list(nx.descendants(g, node))
+        else:
+            members[node] = [node]
+            todo.extend((child, depth + 1) for child in children)
+    g_lod = _get_induced_subgraph(g, set(members.keys()))
+    for node, node_members in members.items():
+        if len(node_members) > 1:
+            g_lod.nodes[node][COLLAPSED] = f'{len(node_members) - 1} nodes'
+    return g_lod, members
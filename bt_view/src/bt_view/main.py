@@ -14,25 +14,66 @@
 # limitations under the License.
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 import datetime
+from functools import partial
 import os
 import random
 import sys
+from typing import Dict, List, Tuple
 
 try:
+    from bt_view import DEFAULT_FORMATS  # type: ignore
     from bt_view import draw_pygraphviz_w_history  # type: ignore
     from bt_view import draw_pygraphviz_w_returnstates  # type: ignore
     from bt_view import draw_pygraphviz_w_valuemod  # type: ignore
+    from bt_view import OUTPUT_FORMATS  # type: ignore
+    from bt_view.lod import collapse_subtrees  # type: ignore
+    from bt_view.lod import get_subtree  # type: ignore
 except ImportError:
+    from .bt_view import DEFAULT_FORMATS
     from .bt_view import draw_pygraphviz_w_history
     from .bt_view import draw_pygraphviz_w_returnstates
     from .bt_view import draw_pygraphviz_w_valuemod
+    from .bt_view import OUTPUT_FORMATS
+    from .lod import collapse_subtrees
+    from .lod import get_subtree
 from btlib.analysis import get_coverage
-from btlib.bts import fbl_to_networkx
 from btlib.bts import xml_to_networkx
+from btlib.cache import read_stats_fbl_cached
 from btlib.common import NODE_STATE
-from btlib.logs import merge_values
-from btlib.logs import read_log_fbl
+from btlib.fbl_reader import get_fingerprint
+from btlib.fbl_reader import tree_arrays_to_networkx
+from btlib.fbl_reader import TreeArrays
+from btlib.logs import read_tree_arrays_and_stats_fbl
+from btlib.stats import NodeStats
+
+
+def _get_path_wo_ext(fnames: List[str]) -> str:
+    """Get the output path for the given input files."""
+    name_wo_ext = ''.join([
+        os.path.splitext(os.path.basename(f))[0]
+        for f in fnames])
+    return os.path.join(
+        os.path.dirname(fnames[0]),
+        name_wo_ext)
+
+
+def _read_fbl(
+    fname: str,
+    no_cache: bool = False
+) -> Tuple[str, TreeArrays, NodeStats]:
+    """
+    Read the fingerprint, the tree and the stats of one log.
+
+    This runs in the worker processes of `--jobs`, so it returns only
+    arrays and no graph.
+    """
+    if no_cache:
+        tree, stats = read_tree_arrays_and_stats_fbl(fname)
+    else:
+        tree, stats = read_stats_fbl_cached(fname)
+    return get_fingerprint(tree), tree, stats
 
 
 def main(args=sys.argv[1:]):
@@ -59,12 +100,52 @@ def main(args=sys.argv[1:]):
         'tree can be provided. The logs will be merged as if they '
         'happened in one run.',
         nargs='*')
+    parser.add_argument(
+        '--group-by-tree',
+        help='If FBL files of different trees are given, merge and render '
+        'the logs of each tree separately instead of failing',
+        action='store_true')
+    parser.add_argument(
+        '--max-depth',
+        help='Level of detail for large trees: Collapse the subtrees below '
+        'this depth into one node that shows the counts of the whole '
+        'subtree. The root is at depth 0.',
+        type=int)
+    parser.add_argument(
+        '--min-activity',
+        help='Level of detail for large trees: Collapse subtrees whose '
+        'nodes together changed their state less often than this.',
+        type=int)
+    parser.add_argument(
+        '--subtree-root',
+        help='Only draw the subtree below the node with this uid. '
+        'The output files get the suffix _subtree<uid>.',
+        type=int)
+    parser.add_argument(
+        '--formats',
+        help='Formats of the output files. They are all drawn from the same '
+        'layout. json-layout gives the positions of nodes and edges.',
+        nargs='+',
+        choices=list(OUTPUT_FORMATS.keys()),
+        default=list(DEFAULT_FORMATS))
     parser.add_argument(
         '--coverage-threshold',
         help='If set, the script will return with exit code 1 if the '
         'coverage is below the threshold. Example: 0.9',
         default=0.0,
         type=float)
+    parser.add_argument(
+        '--jobs',
+        help='Number of processes to read the FBL files and to make the '
+        'images of the nodes in parallel',
+        default=1,
+        type=int)
+    parser.add_argument(
+        '--no-cache',
+        help='Always decode the FBL files instead of using the results of '
+        'previous runs cached in $XDG_CACHE_HOME/bt_tools (by default in '
+        '~/.cache)',
+        action='store_true')
 
     arguments = parser.parse_args(args)
     if not any([
@@ -81,6 +162,10 @@ def main(args=sys.argv[1:]):
               'and will be ignored')
         arguments.bt_xml_fname = None
 
+    # collapsing subtrees copies the tree, so it is only done if asked for
+    collapse = \
+        arguments.max_depth is not None or arguments.min_activity is not None
+
     g = None
 
     # read xml bt definition file
@@ -95,52 +180,76 @@ def main(args=sys.argv[1:]):
         #     g, xpi = assemble_subtrees(g, xpi)
 
     # read fbl log file
+    stats_per_tree = []
     if arguments.bt_log_fbl_fnames:
-        previous_g = None
-        value_count = None
-        value_states = None
-        name_wo_ext = ''.join([
-            os.path.splitext(os.path.basename(f))[0]
-            for f in arguments.bt_log_fbl_fnames])
-        path_wo_ext = os.path.join(
-            os.path.dirname(arguments.bt_log_fbl_fnames[0]),
-            name_wo_ext)
-        for bt_log_fbl_fname in arguments.bt_log_fbl_fnames:
-            g = fbl_to_networkx(bt_log_fbl_fname)
-            try:
-                if previous_g is not None:
-                    assert str(g.adj) == str(previous_g.adj), \
-                        'Graphs must have the same structure'
-                    f' {g.adj} != {previous_g.adj}'
-                    for n in g.nodes:
-                        assert str(g.nodes()[n]) == str(
-                            previous_g.nodes()[n]), \
-                            'Graphs must have the node attributes'
-                        f' {g.nodes()[n]} != {previous_g.nodes()[n]}'
-            except AssertionError as e:
-                print(e)
-                sys.exit(1)
-            previous_g = g
-            vc, vs = read_log_fbl(bt_log_fbl_fname, g)
-            value_count = merge_values(value_count, vc)
-            value_states = merge_values(value_states, vs)
-        draw_pygraphviz_w_valuemod(
-            g,
-            path_wo_ext + '_fbl_log_count',
-            value_mod=value_count,
-        )
-        draw_pygraphviz_w_returnstates(
-            g,
-            path_wo_ext + '_fbl_log_states',
-            value_states=value_states,
-        )
+        read_fn = partial(_read_fbl, no_cache=arguments.no_cache)
+        if arguments.jobs > 1:
+            with ProcessPoolExecutor(max_workers=arguments.jobs) as pool:
+                logs = list(pool.map(
+                    read_fn,
+                    arguments.bt_log_fbl_fnames))
+        else:
+            logs = [
+                read_fn(bt_log_fbl_fname)
+                for bt_log_fbl_fname in arguments.bt_log_fbl_fnames]
+        logs_per_tree: Dict[str, List[int]] = {}
+        for i_log, (fingerprint, _, _) in enumerate(logs):
+            logs_per_tree.setdefault(fingerprint, []).append(i_log)
+        if len(logs_per_tree) > 1 and not arguments.group_by_tree:
+            print('Graphs must have the same structure. '
+                  'Use --group-by-tree to render them separately.')
+            sys.exit(1)
+        for i_logs in logs_per_tree.values():
+            path_wo_ext = _get_path_wo_ext(
+                [arguments.bt_log_fbl_fnames[i] for i in i_logs])
+            # the graph is only built once per tree, to draw it
+            g = tree_arrays_to_networkx(logs[i_logs[0]][1])
+            value_states = NodeStats.merge([logs[i][2] for i in i_logs])
+            stats_per_tree.append((path_wo_ext, value_states))
+            if arguments.subtree_root is not None:
+                if arguments.subtree_root not in g:
+                    parser.error(
+                        f'--subtree-root: There is no node with uid '
+                        f'{arguments.subtree_root} in the tree')
+                g = get_subtree(g, arguments.subtree_root)
+                # only the nodes of the subtree are drawn and normalized
+                value_states = value_states.select(list(g.nodes))
+                path_wo_ext += f'_subtree{arguments.subtree_root}'
+            if collapse:
+                g, members = collapse_subtrees(
+                    g,
+                    max_depth=arguments.max_depth,
+                    min_activity=arguments.min_activity,
+                    stats=value_states)
+                value_states = value_states.aggregate(members)
+            value_count = value_states.get_counts()
+            draw_pygraphviz_w_valuemod(
+                g,
+                path_wo_ext + '_fbl_log_count',
+                value_mod=value_count,
+                formats=arguments.formats,
+            )
+            draw_pygraphviz_w_returnstates(
+                g,
+                path_wo_ext + '_fbl_log_states',
+                value_states=value_states,
+                jobs=arguments.jobs,
+                formats=arguments.formats,
+            )
 
     # calculate coverage
     if arguments.coverage_threshold > 0.0:
         assert arguments.bt_log_fbl_fnames, 'Must provide log file'
-        coverage = get_coverage(value_states)
-        print(f'Coverage: {coverage}')
-        if coverage < arguments.coverage_threshold:
+        below_threshold = False
+        for path_wo_ext, value_states in stats_per_tree:
+            coverage = get_coverage(value_states)
+            if len(stats_per_tree) > 1:
+                print(f'Coverage of {os.path.basename(path_wo_ext)}: '
+                      f'{coverage}')
+            else:
+                print(f'Coverage: {coverage}')
+            below_threshold |= coverage < arguments.coverage_threshold
+        if below_threshold:
             print(
                 f'Coverage is below threshold {arguments.coverage_threshold}')
             sys.exit(1)
@@ -162,7 +271,9 @@ def main(args=sys.argv[1:]):
         draw_pygraphviz_w_history(
             g,
             path_wo_ext + '_demo',
-            value_history=demo_history
+            value_history=demo_history,
+            jobs=arguments.jobs,
+            formats=arguments.formats,
         )
         runtime = datetime.datetime.now() - start_time
         print(f'Runtime: {runtime}')
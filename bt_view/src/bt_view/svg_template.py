@@ -0,0 +1,109 @@
+"""Recolor rendered behavior trees without graphviz."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from functools import lru_cache
+import re
+from typing import Dict
+
+from bt_view.bt_view import to_agraph
+from btlib import VALUE_MAP_COLORS
+import networkx as nx
+from PIL import ImageColor
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+# the first polygon of a node is its box, its fill is always `#rrggbb`
+NODE_FILL_RE = re.compile(
+    rb'<g id="(\d+)" class="node">\s*<title>[^<]*</title>\s*'
+    rb'<polygon fill="(#[0-9a-fA-F]{6})"')
+FILL_LEN = len('#rrggbb')
+
+
+@lru_cache(maxsize=None)
+def _to_fill(color: str) -> bytes:
+    """Convert a hex or CSS color name (as in PIL) to `#rrggbb`."""
+    r, g, b = ImageColor.getrgb(color)[:3]
+    return f'#{r:02x}{g:02x}{b:02x}'.encode()
+
+
+def has_png_support() -> bool:
+    """Check if `SvgTemplate.render_png` can be used."""
+    return cairosvg is not None
+
+
+class SvgTemplate:
+    """
+    A rendered tree whose node colors can be changed without graphviz.
+
+    The svg is searched once for the fill color of the box of each node.
+    Rendering new colors then only overwrites these bytes in place.
+    Nodes that are not given a new color keep their last color.
+    """
+
+    def __init__(self, svg: bytes):
+        self._svg = bytearray(svg)
+        self.fill_offsets: Dict[int, int] = {
+            int(match.group(1)): match.start(2)
+            for match in NODE_FILL_RE.finditer(svg)}
+
+    @classmethod
+    def from_graph(cls, g: nx.Graph, color: str) -> 'SvgTemplate':
+        """
+        Render a template of the tree with all nodes in the same color.
+
+        :param g: The behavior tree.
+        :param color: Initial fill color of all nodes.
+        :return: The template.
+        """
+        A = to_agraph(
+            g,
+            lambda node: node.attr.update(
+                style='filled',
+                fillcolor=_to_fill(color).decode(),
+            )
+        )
+        template = cls(A.draw(format='svg'))
+        missing = set(g.nodes) - template.fill_offsets.keys()
+        if missing:
+            raise ValueError(f'Nodes not found in svg: {sorted(missing)}')
+        return template
+
+    def render(self, value_color: VALUE_MAP_COLORS) -> bytes:
+        """
+        Set the fill colors of the nodes.
+
+        :param value_color: Color per node id, e.g. `#ff0000`.
+        :return: The svg file content.
+        """
+        for node, color in value_color.items():
+            offset = self.fill_offsets[node]
+            self._svg[offset:offset + FILL_LEN] = _to_fill(color)
+        return bytes(self._svg)
+
+    def render_png(self, value_color: VALUE_MAP_COLORS) -> bytes:
+        """
+        Set the fill colors of the nodes and rasterize the result.
+
+        This needs the optional dependency `cairosvg`, see `has_png_support`.
+
+        :param value_color: Color per node id, e.g. `#ff0000`.
+        :return: The png file content.
+        """
+        if cairosvg is None:
+            raise ImportError('Rendering png files requires cairosvg')
+        return cairosvg.svg2png(bytestring=self.render(value_color))
@@ -14,12 +14,36 @@
 
 from itertools import combinations
 from itertools import product
+import json
 import os
+import re
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
+from bt_view import bt_view
+from bt_view.main import _read_fbl
 from bt_view.main import main
+from btlib.fbl_reader import TreeArrays
+import pygraphviz as pgv
 
 TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '_test_data')
+GRAPHVIZ_VERSION_PATTERN = re.compile(r'Generated by graphviz version (\S+)')
+
+
+def _get_graphviz_version(svg: str) -> str:
+    """Get the version of graphviz that made a svg file."""
+    match = GRAPHVIZ_VERSION_PATTERN.search(svg)
+    assert match is not None, 'No graphviz version in the svg'
+    return match.group(1)
+
+
+GRAPHVIZ_VERSION = _get_graphviz_version(
+    pgv.AGraph().draw(format='svg', prog='dot').decode())
+with open(os.path.join(
+        TEST_DATA_DIR, 'reference', 'bt_trace1_fbl_log_count.svg'), 'r') as f:
+    REFERENCE_GRAPHVIZ_VERSION = _get_graphviz_version(f.read())
 
 
 class TestBtViewMain(unittest.TestCase):
@@ -35,9 +59,16 @@ class TestBtViewMain(unittest.TestCase):
 
     def setUp(self):
         self._remove_old_images()
+        # keep the cache of decoded logs out of the home directory
+        self.cache_home = tempfile.mkdtemp()
+        self.env = mock.patch.dict(
+            os.environ, {'XDG_CACHE_HOME': self.cache_home})
+        self.env.start()
 
     def tearDown(self):
         self._remove_old_images()
+        self.env.stop()
+        shutil.rmtree(self.cache_home)
 
     def _remove_old_images(self):
         """Remove old image files in test data directory."""
@@ -104,6 +135,11 @@ class TestBtViewMain(unittest.TestCase):
     @unittest.skipIf(
         os.path.exists('/.dockerenv') and os.environ.get('ROS_DISTRO') == 'rolling',
         'Skipping test on ROS2 rolling, because there is some regression.')
+    @unittest.skipUnless(
+        GRAPHVIZ_VERSION == REFERENCE_GRAPHVIZ_VERSION,
+        f'The references were made with graphviz '
+        f'{REFERENCE_GRAPHVIZ_VERSION}, which renders text differently than '
+        f'the installed graphviz {GRAPHVIZ_VERSION}.')
     def test_bt_view_main_regression_log(self):
         """Test if images are identical to the reference for log data."""
         bt_log_fbl_fnames = [
@@ -136,6 +172,9 @@ class TestBtViewMain(unittest.TestCase):
         os.path.exists('/.dockerenv'),
         'Skipping test in docker container, because I can not get the '
         'seeding to be consistent.')
+    @unittest.skipUnless(
+        GRAPHVIZ_VERSION == REFERENCE_GRAPHVIZ_VERSION,
+        'The references were made with another graphviz version.')
     def test_bt_view_main_regression_static(self):
         """Test if images are identical to the reference for static data."""
         bt_fbl_fnames = [
@@ -180,6 +219,21 @@ class TestBtViewMain(unittest.TestCase):
                   bt_log_fbl_fname_other])
         self.assertEqual(cm.exception.code, 1)
 
+    def test_bt_view_main_multiple_fbl_files_group_by_tree(self):
+        """FBL files from different BTs are rendered separately."""
+        bt_log_fbl_fnames = [
+            os.path.join(TEST_DATA_DIR, f'bt_trace{no}.fbl')
+            for no in ['1', '_other', '2']]
+        main(['--bt_log_fbl_fname', *bt_log_fbl_fnames, '--group-by-tree'])
+        for name, data, img in product(
+            ['bt_trace1bt_trace2', 'bt_trace_other'],
+            self.log_data_exts,
+            self.img_exts
+        ):
+            fname = os.path.join(
+                TEST_DATA_DIR, f'{name}_fbl_log_{data}.{img}')
+            self.assertTrue(os.path.isfile(fname), fname)
+
     def test_bt_view_main_multiple_fbl_files_merge(self):
         """If multiple FBL files the output should be merged."""
         bt_log_fbl_fname1 = os.path.join(
@@ -247,6 +301,125 @@ class TestBtViewMain(unittest.TestCase):
             self.assertNotEqual(svg_hashes_fbl[fname_a],
                                 svg_hashes_fbl[fname_b])
 
+    def test_bt_view_main_multiple_fbl_files_jobs(self):
+        """Reading the FBL files in parallel gives the same output."""
+        bt_log_fbl_fnames = [
+            os.path.join(TEST_DATA_DIR, f'bt_trace{no}.fbl')
+            for no in ['1', '2', '1']]
+        fnames_svg = [
+            os.path.join(
+                TEST_DATA_DIR, f'bt_trace1bt_trace2bt_trace1_fbl_log_{data}.svg')
+            for data in self.log_data_exts]
+        svgs = []
+        for jobs in ['1', '2']:
+            main(['--bt_log_fbl_fname', *bt_log_fbl_fnames, '--jobs', jobs])
+            for fname in fnames_svg:
+                with open(fname, 'r') as f:
+                    svgs.append(f.read())
+        self.assertEqual(svgs[:len(fnames_svg)], svgs[len(fnames_svg):])
+
+    def test_bt_view_main_cache_dir(self):
+        """Decoded logs and layouts are cached below $XDG_CACHE_HOME."""
+        with mock.patch.object(bt_view, '_layouts', bt_view.OrderedDict()):
+            for no in ['1', '2']:
+                bt_log_fbl_fname = os.path.join(
+                    TEST_DATA_DIR, f'bt_trace{no}.fbl')
+                main(['--bt_log_fbl_fnames', bt_log_fbl_fname, '--demo'])
+        cache_dir = os.path.join(self.cache_home, 'bt_tools')
+        self.assertEqual(
+            len([f for f in os.listdir(cache_dir) if f.endswith('.npz')]), 2)
+        # all views of both logs of the same tree share one layout
+        self.assertEqual(
+            len(os.listdir(os.path.join(cache_dir, 'layouts'))), 1)
+
+    def test_read_fbl(self):
+        """The workers of --jobs return arrays and no graph."""
+        fingerprints = []
+        for no in ['1', '2']:
+            fingerprint, tree, stats = _read_fbl(
+                os.path.join(TEST_DATA_DIR, f'bt_trace{no}.fbl'),
+                no_cache=True)
+            self.assertIsInstance(tree, TreeArrays)
+            self.assertEqual(stats.uids.tolist(), tree.uids.tolist())
+            fingerprints.append(fingerprint)
+        self.assertEqual(fingerprints[0], fingerprints[1])
+
+    def test_bt_view_main_level_of_detail(self):
+        """Collapse subtrees and draw a subtree separately."""
+        bt_log_fbl_fname = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        main(['--bt_log_fbl_fnames', bt_log_fbl_fname, '--max-depth', '1'])
+        fname = os.path.join(TEST_DATA_DIR, 'bt_trace1_fbl_log_states.svg')
+        with open(fname, 'r') as f:
+            svg = f.read()
+        self.assertIn('RateController', svg)
+        self.assertIn('collapsed: 5 nodes', svg)
+        self.assertNotIn('GoalUpdated', svg)
+
+        main(['--bt_log_fbl_fnames', bt_log_fbl_fname,
+              '--subtree-root', '32'])
+        fname = os.path.join(
+            TEST_DATA_DIR, 'bt_trace1_subtree32_fbl_log_count.svg')
+        with open(fname, 'r') as f:
+            svg = f.read()
+        self.assertIn('FollowPathRecoveryFallback', svg)
+        self.assertNotIn('RateController', svg)
+
+        # an unknown uid is a usage error
+        with mock.patch('sys.stderr'), \
+                self.assertRaises(SystemExit) as cm:
+            main(['--bt_log_fbl_fnames', bt_log_fbl_fname,
+                  '--subtree-root', '1000'])
+        self.assertEqual(cm.exception.code, 2)
+
+    def test_bt_view_main_subtree_stats(self):
+        """Only the nodes of the subtree are drawn and normalized."""
+        bt_log_fbl_fname = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        with mock.patch.object(
+                bt_view, '_log_normalize',
+                wraps=bt_view._log_normalize) as log_normalize, \
+                mock.patch.object(
+                    bt_view, '_make_return_value_bargraph',
+                    wraps=bt_view._make_return_value_bargraph) as bargraph:
+            main(['--bt_log_fbl_fnames', bt_log_fbl_fname,
+                  '--subtree-root', '32'])
+        subtree = {32, 33, 34, 35, 36}
+        # the count and the states view
+        self.assertEqual(log_normalize.call_count, 2)
+        for call in log_normalize.call_args_list:
+            self.assertEqual(set(call.args[0]), subtree)
+        # only the two ticked nodes of the subtree get a bar graph, scaled to
+        # their own maximum and not to the more active nodes outside
+        bars = [call.args[0] for call in bargraph.call_args_list]
+        self.assertEqual(len(bars), 2)
+        self.assertEqual(max(max(b) for b in bars), 1.)
+
+    def test_bt_view_main_no_level_of_detail(self):
+        """Subtrees are not collapsed if no level of detail is given."""
+        bt_log_fbl_fname = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        with mock.patch('bt_view.main.collapse_subtrees') as collapse:
+            main(['--bt_log_fbl_fnames', bt_log_fbl_fname])
+            collapse.assert_not_called()
+
+    def test_bt_view_main_formats(self):
+        """Only the requested output formats are written."""
+        bt_log_fbl_fname = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        main(['--bt_log_fbl_fnames', bt_log_fbl_fname,
+              '--formats', 'svg', 'pdf', 'json-layout'])
+        for data in self.log_data_exts:
+            fname = os.path.join(TEST_DATA_DIR, f'bt_trace1_fbl_log_{data}')
+            self.assertTrue(os.path.isfile(fname + '.svg'))
+            self.assertFalse(os.path.isfile(fname + '.png'))
+            with open(fname + '.pdf', 'rb') as f:
+                self.assertTrue(f.read().startswith(b'%PDF'))
+            with open(fname + '.json', 'r') as f:
+                layout = json.load(f)
+            self.assertIn('bb', layout)
+            self.assertEqual(
+                {o['name'] for o in layout['objects']},
+                {str(n) for n in range(25, 37)})
+            for ext in ['pdf', 'json']:
+                os.remove(f'{fname}.{ext}')
+
     def test_bt_view_main_coverage(self):
         """Test the calculation of the coverage."""
         # this file has 12 nodes and 6 are covered
@@ -13,13 +13,51 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from functools import partial
+import multiprocessing
+import os
+import tempfile
 import unittest
+from unittest import mock
 
+from bt_view import bt_view
 from bt_view.bt_view import _log_normalize
+from btlib.stats import NodeStats
+import networkx as nx
+import numpy as np
+
+
+def _make_stats() -> NodeStats:
+    """Stats of the nodes of the test tree in `TestBtView.setUp`."""
+    return NodeStats.from_state_counts([0, 1, 2], np.array([
+        [1, 0, 3, 0],
+        [0, 0, 0, 0],
+        [0, 2, 0, 0],
+    ]))
 
 
 class TestBtView(unittest.TestCase):
 
+    def setUp(self):
+        self.g = nx.DiGraph()
+        self.g.add_edges_from([(0, 1), (0, 2)])
+        for node in self.g.nodes:
+            self.g.nodes[node]['NAME'] = f'node{node}'
+        # keep the layouts out of the home directory and out of memory
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.layout_folder = os.path.join(self.tmpdir.name, 'layouts')
+        self.patches = [
+            mock.patch.object(bt_view, 'LAYOUT_FOLDER', self.layout_folder),
+            mock.patch.object(bt_view, '_layouts', bt_view.OrderedDict()),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.tmpdir.cleanup()
+
     def test_log_normalize(self):
         """Make sure that _log_normalize works as expected."""
         # mapping from [-1, 1] to [0, 1]
@@ -100,3 +138,240 @@ class TestBtView(unittest.TestCase):
         # test that a ValueError is raised if the input is of the wrong type
         with self.assertRaises(ValueError):
             _log_normalize({0: 'a'})
+
+    def test_log_normalize_node_stats(self):
+        """Normalize NodeStats like the equivalent value map."""
+        stats = NodeStats.from_state_counts([0, 1, 2, 3], np.array([
+            [0, 0, 0, 0],
+            [1, 0, 3, 0],
+            [10, 100, 0, 1],
+            [0, 0, 0, 0],
+        ]))
+        value_states = stats.to_value_maps()[1]
+        for vmin, vmax in [(0, 1), (-1, 1)]:
+            expected = _log_normalize(value_states, vmin, vmax)
+            output = _log_normalize(stats, vmin, vmax)
+            self.assertEqual(output.keys(), expected.keys())
+            for k in expected:
+                if expected[k] is None:
+                    self.assertIsNone(output[k])
+                else:
+                    np.testing.assert_allclose(output[k], expected[k])
+
+    def test_get_layout(self):
+        """Lay out a tree only once, independent of the node colors."""
+        A = nx.nx_agraph.to_agraph(self.g)
+        layout = bt_view.get_layout(A)
+        self.assertEqual(layout['nodes'].keys(), {'0', '1', '2'})
+        self.assertEqual(len(layout['edges']), 2)
+        self.assertEqual(len(os.listdir(self.layout_folder)), 1)
+        # the given graph is not modified
+        self.assertFalse(A.has_layout)
+
+        # styles that do not change the node sizes reuse the layout
+        A.get_node(1).attr['fillcolor'] = 'red'
+        with mock.patch.object(bt_view, '_make_layout') as make_layout:
+            self.assertIs(bt_view.get_layout(A), layout)
+            bt_view._layouts.clear()
+            self.assertEqual(bt_view.get_layout(A), layout)
+            make_layout.assert_not_called()
+
+        # a different structure needs a new layout
+        A.add_edge(2, 3)
+        self.assertEqual(len(bt_view.get_layout(A)['edges']), 3)
+        self.assertEqual(len(os.listdir(self.layout_folder)), 2)
+
+    def test_get_layout_views(self):
+        """All views of a tree share one layout, whatever the values."""
+        g = self.g
+        stats = _make_stats()
+        fname = os.path.join(self.tmpdir.name, 'out')
+        with mock.patch.object(bt_view, 'BG_IMG_FOLDER', self.tmpdir.name), \
+                mock.patch.object(
+                    bt_view, '_make_layout',
+                    wraps=bt_view._make_layout) as make_layout:
+            bt_view.draw_pygraphviz_w_valuemod(
+                g, fname, stats.get_counts(), formats=['svg'])
+            bt_view.draw_pygraphviz_w_valuemod(
+                g, fname, {0: 12345, 1: None, 2: 1}, formats=['svg'])
+            bt_view.draw_pygraphviz_w_returnstates(
+                g, fname, stats, formats=['svg'])
+            bt_view.draw_pygraphviz_w_history(
+                g, fname, {0: [1, 2], 1: None, 2: [3]}, formats=['svg'])
+            make_layout.assert_called_once()
+
+        # longer names make larger nodes
+        g.nodes[1]['NAME'] = 'node1' * 10
+        bt_view.draw_pygraphviz(g, fname, None, formats=['svg'])
+        self.assertEqual(len(os.listdir(self.layout_folder)), 2)
+
+    def test_draw_pygraphviz_cached_layout(self):
+        """Drawing with a cached layout gives the same result."""
+        self.g.add_edge(2, 3)
+        self.g.nodes[3]['NAME'] = 'node3'
+        svgs = []
+        for i in range(2):
+            fname = os.path.join(self.tmpdir.name, f'out{i}')
+            bt_view.draw_pygraphviz(self.g, fname, None)
+            with open(fname + '.svg', 'r') as f:
+                svgs.append(f.read())
+            self.assertTrue(os.path.isfile(fname + '.png'))
+            bt_view._layouts.clear()
+        self.assertEqual(svgs[0], svgs[1])
+
+    def test_thumbnail_cache(self):
+        """Thumbnails are reused across renders and evicted by size."""
+        g = self.g
+        value_history = {0: [1, 2, 3], 1: [2, 2, 4], 2: None}
+        with tempfile.TemporaryDirectory() as img_folder, \
+                mock.patch.object(bt_view, 'BG_IMG_FOLDER', img_folder):
+            fname = os.path.join(self.tmpdir.name, 'history')
+            bt_view.draw_pygraphviz_w_history(g, fname, value_history)
+            paths = sorted(
+                os.path.join(img_folder, f) for f in os.listdir(img_folder))
+            self.assertEqual(len(paths), 2)
+            for path in paths:
+                os.utime(path, ns=(0, 0))
+
+            # a second render reuses and touches the thumbnails
+            with mock.patch.object(bt_view.Image, 'new') as new:
+                bt_view.draw_pygraphviz_w_history(g, fname, value_history)
+                new.assert_not_called()
+            for path in paths:
+                self.assertGreater(os.stat(path).st_mtime_ns, 0)
+
+            # the least recently used files are removed if there are too many
+            os.utime(paths[0], ns=(0, 0))
+            with mock.patch.object(
+                    bt_view, 'BG_IMG_FOLDER_MAX_BYTES',
+                    os.stat(paths[1]).st_size):
+                bt_view._evict_images()
+            self.assertFalse(os.path.exists(paths[0]))
+            self.assertTrue(os.path.exists(paths[1]))
+
+    def test_make_return_value_bargraph(self):
+        """Draw one bar per state with the height of its value."""
+        with tempfile.TemporaryDirectory() as img_folder, \
+                mock.patch.object(bt_view, 'BG_IMG_FOLDER', img_folder):
+            self.assertIsNone(bt_view._make_return_value_bargraph(None, 1))
+            img_path = bt_view._make_return_value_bargraph(
+                [1., 0., .5, 2.], 1)
+            with bt_view.Image.open(img_path) as img:
+                self.assertEqual(img.size, (
+                    bt_view.BARGRAPH_WIDTH_PX, bt_view.BARGRAPH_HEIGHT_PX))
+                img = img.convert('RGB')
+            colors = [
+                bt_view.ImageColor.getrgb(
+                    bt_view.COLORS_PER_RETURN_STATE[state])
+                for state in bt_view.NODE_STATE]
+            white = (255, 255, 255)
+            bar_width = bt_view.BARGRAPH_WIDTH_PX // 4
+            top = 0
+            middle = bt_view.BARGRAPH_HEIGHT_PX * 3 // 4
+            for i_bar, (top_color, middle_color) in enumerate([
+                (colors[0], colors[0]),
+                (white, white),
+                (white, colors[2]),
+                # values above the maximum are clipped
+                (colors[3], colors[3]),
+            ]):
+                x = int((i_bar + .5) * bar_width)
+                self.assertEqual(img.getpixel((x, top)), top_color)
+                self.assertEqual(img.getpixel((x, middle)), middle_color)
+
+    def test_make_images(self):
+        """Make each distinct image once, also in parallel."""
+        value_history = {0: [1, 2, 3], 1: [2, 2, 4], 2: None, 3: [1, 2, 3]}
+        # the workers must not depend on the patched state of the module,
+        # which they do not get with the `spawn` start method
+        spawn_pool = partial(
+            bt_view.ProcessPoolExecutor,
+            mp_context=multiprocessing.get_context('spawn'))
+        for jobs in [1, 2]:
+            with tempfile.TemporaryDirectory() as img_folder, \
+                    mock.patch.object(bt_view, 'BG_IMG_FOLDER', img_folder), \
+                    mock.patch.object(
+                        bt_view, 'ProcessPoolExecutor', spawn_pool):
+                images = bt_view._make_images(
+                    bt_view._make_history_image, value_history, jobs)
+                self.assertEqual(images.keys(), value_history.keys())
+                self.assertIsNone(images[2])
+                self.assertEqual(images[0], images[3])
+                self.assertNotEqual(images[0], images[1])
+                self.assertEqual(
+                    sorted(os.listdir(img_folder)),
+                    sorted(os.path.basename(images[i]) for i in [0, 1]))
+                for i in [0, 1]:
+                    self.assertEqual(os.path.dirname(images[i]), img_folder)
+
+    def test_make_history_image(self):
+        """Draw short and long histories with one color per state."""
+        width_px = int(bt_view.NODE_WIDTH_IN * bt_view.DPI)
+        colors = bt_view.HISTORY_LUT.tolist()
+        with tempfile.TemporaryDirectory() as img_folder, \
+                mock.patch.object(bt_view, 'BG_IMG_FOLDER', img_folder):
+            self.assertIsNone(bt_view._make_history_image(None))
+            # short histories are stretched
+            img_path = bt_view._make_history_image([None, 1, 2])
+            with bt_view.Image.open(img_path) as img:
+                self.assertEqual(img.width, width_px)
+                row = [list(img.getpixel((x, 0))) for x in range(width_px)]
+            third = width_px // 3
+            self.assertEqual(row[:third], [colors[0]] * third)
+            self.assertEqual(row[-third:], [colors[2]] * third)
+            # long histories show the most frequent state per column
+            states = np.full(width_px * 1000, 3, dtype=np.uint8)
+            states[:width_px * 500] = 4
+            states[:width_px * 500:3] = 1
+            img_path = bt_view._make_history_image(states)
+            with bt_view.Image.open(img_path) as img:
+                self.assertEqual(img.width, width_px)
+                row = [list(img.getpixel((x, 0))) for x in range(width_px)]
+            half = width_px // 2
+            self.assertEqual(row[:half], [colors[4]] * half)
+            self.assertEqual(row[-half:], [colors[3]] * half)
+
+    def test_colormap(self):
+        """The colormap lookup table gives the colors of matplotlib."""
+        import matplotlib as mpl
+        values = np.concatenate([np.linspace(-.1, 1.1, 1001), [np.nan]])
+        # RdYlGn is built in, other colormaps are taken from matplotlib
+        for cm_name in ['RdYlGn', 'viridis']:
+            cmap = mpl.colormaps[cm_name]
+            colors = bt_view._colormap_values(cm_name, values.copy())
+            for value, color in zip(values[:-1], colors):
+                rgba = cmap(value)
+                expected = '#' + ''.join(
+                    f'{int((c * 0.5 + 0.5) * 255):02x}' for c in rgba[:3])
+                self.assertEqual(color, expected)
+                self.assertEqual(bt_view._colormap(cm_name, value), expected)
+            self.assertEqual(colors[-1], bt_view.GRAY)
+        self.assertEqual(bt_view._colormap('RdYlGn', None), bt_view.GRAY)
+
+    def test_log_normalize_zeros(self):
+        """Values that are all zero are in the center."""
+        self.assertEqual(
+            _log_normalize({0: 0, 1: None, 2: [0, 0]}, vmin=0, vmax=1),
+            {0: 0.5, 1: None, 2: [0.5, 0.5]})
+
+    def test_draw_with_overlay(self):
+        """Values are shown in the labels without changing the graph."""
+        g = self.g
+        nodes_before = {n: dict(attrs) for n, attrs in g.nodes(data=True)}
+        stats = _make_stats()
+        tmpdir = self.tmpdir.name
+        with mock.patch.object(bt_view, 'BG_IMG_FOLDER', tmpdir):
+            fname = os.path.join(tmpdir, 'states')
+            bt_view.draw_pygraphviz_w_returnstates(
+                g, fname, stats, formats=['svg'])
+            with open(fname + '.svg', 'r') as f:
+                svg = f.read()
+            self.assertIn('values: S: 1 F: 0 R: 3 I: 0', svg)
+            fname = os.path.join(tmpdir, 'count')
+            bt_view.draw_pygraphviz_w_valuemod(
+                g, fname, stats.get_counts(), formats=['svg'])
+            with open(fname + '.svg', 'r') as f:
+                svg = f.read()
+            self.assertIn('value: 4', svg)
+            self.assertIn('value: None', svg)
+        self.assertEqual(dict(g.nodes(data=True)), nodes_before)
@@ -0,0 +1,84 @@
+"""Tests for the bt_view.lod module."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from bt_view.lod import collapse_subtrees, COLLAPSED, get_root, get_subtree
+from btlib.stats import NodeStats
+import networkx as nx
+import numpy as np
+
+
+class TestLod(unittest.TestCase):
+
+    def setUp(self):
+        #       0
+        #     /   \
+        #    1     4
+        #   / \     \
+        #  2   3     5
+        #             \
+        #              6
+        self.g = nx.DiGraph()
+        self.g.add_edges_from([(0, 1), (1, 2), (1, 3), (0, 4), (4, 5), (5, 6)])
+        self.stats = NodeStats(list(range(7)), np.array([
+            [1, 0, 0, 0],
+            [1, 0, 0, 0],
+            [0, 1, 0, 0],
+            [0, 0, 0, 0],
+            [5, 0, 0, 0],
+            [0, 0, 2, 0],
+            [0, 0, 0, 3],
+        ]))
+
+    def test_get_subtree(self):
+        """Get the subtree below a node."""
+        self.assertEqual(get_root(self.g), 0)
+        subtree = get_subtree(self.g, 4)
+        self.assertEqual(set(subtree.nodes), {4, 5, 6})
+        self.assertEqual(get_root(subtree), 4)
+        with self.assertRaises(AssertionError):
+            get_subtree(self.g, 42)
+
+    def test_collapse_max_depth(self):
+        """Subtrees below the maximum depth are collapsed."""
+        g, members = collapse_subtrees(self.g)
+        self.assertEqual(set(g.nodes), set(self.g.nodes))
+        self.assertEqual(members, {n: [n] for n in self.g.nodes})
+
+        g, members = collapse_subtrees(self.g, max_depth=1)
+        self.assertEqual(set(g.nodes), {0, 1, 4})
+        self.assertEqual(sorted(members[1]), [1, 2, 3])
+        self.assertEqual(sorted(members[4]), [4, 5, 6])
+        self.assertEqual(g.nodes[1][COLLAPSED], '2 nodes')
+        # the order of the children is kept
+        self.assertEqual(list(g.successors(0)), [1, 4])
+        self.assertNotIn(COLLAPSED, g.nodes[0])
+
+        aggregated = self.stats.aggregate(members)
+        self.assertEqual(aggregated[1], [1, 1, 0, 0])
+        self.assertEqual(aggregated[4], [5, 0, 2, 3])
+
+    def test_collapse_min_activity(self):
+        """Subtrees with little activity are collapsed."""
+        g, members = collapse_subtrees(
+            self.g, min_activity=3, stats=self.stats)
+        self.assertEqual(set(g.nodes), {0, 1, 4, 5, 6})
+        self.assertEqual(sorted(members[1]), [1, 2, 3])
+        # leaves have nothing to collapse
+        self.assertEqual(members[6], [6])
+
+        with self.assertRaises(AssertionError):
+            collapse_subtrees(self.g, min_activity=3)
@@ -0,0 +1,75 @@
+"""Tests for the bt_view.svg_template module."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from bt_view import bt_view
+from bt_view.bt_view import draw_pygraphviz_w_colorvalues
+from bt_view.svg_template import has_png_support, SvgTemplate
+from btlib.bts import fbl_to_networkx
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '_test_data')
+
+
+class TestSvgTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.g = fbl_to_networkx(os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl'))
+        self.layout_folder = tempfile.TemporaryDirectory()
+        self.patch = mock.patch.object(
+            bt_view, 'LAYOUT_FOLDER', self.layout_folder.name)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.layout_folder.cleanup()
+
+    def test_render(self):
+        """Recoloring the template is the same as drawing with graphviz."""
+        template = SvgTemplate.from_graph(self.g, '#DDDDDD')
+        self.assertEqual(template.fill_offsets.keys(), set(self.g.nodes))
+        value_color = {n: '#dddddd' for n in self.g.nodes}
+        for colors in [
+            {26: '#00ff00', 28: '#ff0000'},
+            {26: '#ffff00', 27: '#00ff00'},
+        ]:
+            value_color.update(colors)
+            # only the changed nodes are given, the others stay the same
+            svg = template.render(colors)
+            with tempfile.TemporaryDirectory() as tmpdir:
+                fname = os.path.join(tmpdir, 'colors')
+                draw_pygraphviz_w_colorvalues(self.g, fname, value_color)
+                with open(f'{fname}.svg', 'rb') as f:
+                    self.assertEqual(svg, f.read())
+
+    def test_render_color_names(self):
+        """Colors can be given in any format."""
+        template = SvgTemplate.from_graph(self.g, 'gray')
+        svg = template.render({26: 'red', 28: '#0F0'})
+        self.assertIn(b'fill="#ff0000"', svg)
+        self.assertIn(b'fill="#00ff00"', svg)
+        self.assertIn(b'fill="#808080"', svg)
+        with self.assertRaises(KeyError):
+            template.render({1234: 'red'})
+
+    @unittest.skipUnless(has_png_support(), 'cairosvg is not installed')
+    def test_render_png(self):
+        """Render png files from the template."""
+        template = SvgTemplate.from_graph(self.g, '#DDDDDD')
+        png = template.render_png({26: '#00ff00'})
+        self.assertTrue(png.startswith(b'\x89PNG'))
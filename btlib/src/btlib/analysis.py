@@ -15,13 +15,19 @@
 from typing import Union
 
 from btlib import VALUE_MAP, VALUE_MAP_RETURN_STATES
+from btlib.fbl_reader import CHUNK_RECORDS, iter_log_chunks
+from btlib.stats import NodeStats
+import networkx as nx
 
 
-def get_coverage(values: Union[VALUE_MAP, VALUE_MAP_RETURN_STATES]) -> float:
+def get_coverage(
+        values: Union[VALUE_MAP, VALUE_MAP_RETURN_STATES, NodeStats]) -> float:
     """Get coverage."""
     n_values = len(values)
     if n_values == 0:
         return 0.0
+    if isinstance(values, NodeStats):
+        return int((~values.never_ticked).sum()) / n_values
     n_values_covered = 0
     for id_ in values:
         if values[id_] is None:
@@ -34,3 +40,17 @@ def get_coverage(values: Union[VALUE_MAP, VALUE_MAP_RETURN_STATES]) -> float:
         else:
             raise ValueError(f'Unknown type {type(values[id_])}')
     return n_values_covered / n_values
+
+
+def get_coverage_fbl(fname: str, g: nx.Graph,
+                     chunk_records: int = CHUNK_RECORDS) -> float:
+    """
+    Get coverage of a log file without loading the whole log.
+
+    :param fname: Log file name.
+    :param g: Graph representing the behavior tree.
+    :param chunk_records: Number of records to process at once.
+    """
+    stats = NodeStats(list(g.nodes()))
+    stats.add_record_chunks(iter_log_chunks(fname, chunk_records))
+    return get_coverage(stats)
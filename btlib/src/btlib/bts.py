@@ -21,7 +21,7 @@ from bs4 import BeautifulSoup
 from bs4.element import Tag
 from btlib import VALUE_MAP, XML_PER_ID
 from btlib.common import NODE_CAT
-from btlib.fbl_reader import read_bt
+from btlib.fbl_reader import open_fbl, read_bt
 import networkx as nx
 
 
@@ -108,8 +108,7 @@ def xml_to_networkx(fname: str) -> nx.Graph:
 
 def fbl_to_networkx(fname: str) -> nx.Graph:
     """Read a fbl file into a networkx graph."""
-    with open(fname, 'rb') as file_b:
-        buf = bytearray(file_b.read())
+    with open_fbl(fname) as buf:
         g = read_bt(buf)
     assert g, 'Graph must exist'
     return g
@@ -0,0 +1,169 @@
+"""Persistent cache of decoded fbl logs."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import io
+import logging
+import os
+import threading
+from typing import Optional, Tuple
+import zipfile
+
+from btlib.fbl_reader import get_header_size, read_bt_arrays, TreeArrays
+from btlib.logs import read_tree_arrays_and_stats_fbl
+from btlib.stats import NodeStats
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_BYTES = 1 << 30
+# bump this when the content of the cache entries changes
+CACHE_VERSION = 1
+# bytes from the start and the end of a file that are hashed
+HASH_SAMPLE_BYTES = 1 << 16
+
+
+def get_cache_dir() -> str:
+    """
+    Get the folder of the caches of bt_tools.
+
+    It is `$XDG_CACHE_HOME/bt_tools`, by default in `~/.cache`. This is
+    resolved on every call, so that the environment can be changed.
+    """
+    return os.path.join(
+        os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+        'bt_tools')
+
+
+def atomic_write(path: str, data: bytes):
+    """
+    Write a file so that readers never see it partially written.
+
+    The data is written to a temporary file with a name unique to this
+    process and thread, which then replaces `path`.
+    """
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def touch(path: str):
+    """Mark a cache entry as recently used."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        # evicted by another process in the meantime
+        pass
+
+
+def evict_lru(folder: str, max_bytes: int):
+    """Remove the least recently used files until `max_bytes` are left."""
+    entries = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+
+def get_cache_key(fname: str) -> str:
+    """
+    Get a key that changes when the content of the file changes.
+
+    It combines size and modification time with a hash of the start and the
+    end of the file, so that the file does not need to be read completely.
+    """
+    stat = os.stat(fname)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{CACHE_VERSION}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    with open(fname, 'rb') as f:
+        h.update(f.read(HASH_SAMPLE_BYTES))
+        if stat.st_size > HASH_SAMPLE_BYTES:
+            f.seek(max(stat.st_size - HASH_SAMPLE_BYTES, HASH_SAMPLE_BYTES))
+            h.update(f.read(HASH_SAMPLE_BYTES))
+    return h.hexdigest()
+
+
+def _load_entry(path: str) -> Optional[Tuple[TreeArrays, NodeStats]]:
+    try:
+        with np.load(path, allow_pickle=False) as entry:
+            tree = entry['tree'].tobytes()
+            stats = NodeStats(entry['uids'], entry['counts'])
+    except FileNotFoundError:
+        return None
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        logger.warning(f'Ignoring broken cache entry {path}: {e}')
+        return None
+    return read_bt_arrays(tree), stats
+
+
+def _make_entry(fname: str, stats: NodeStats) -> bytes:
+    with open(fname, 'rb') as f:
+        header = f.read(4)
+        tree = header + f.read(get_header_size(header))
+    out = io.BytesIO()
+    np.savez(
+        out,
+        tree=np.frombuffer(tree, dtype=np.uint8),
+        uids=stats.uids,
+        counts=stats.counts)
+    return out.getvalue()
+
+
+def read_stats_fbl_cached(
+    fname: str,
+    cache_dir: Optional[str] = None,
+    max_bytes: int = CACHE_MAX_BYTES
+) -> Tuple[TreeArrays, NodeStats]:
+    """
+    Read tree and `NodeStats` from a log file.
+
+    See `read_tree_arrays_and_stats_fbl`, use `tree_arrays_to_networkx` to
+    get the graph of the tree.
+
+    The result is stored in `cache_dir` (by default `get_cache_dir()`) so
+    that reading the same file again does not need to decode it. The least
+    recently used entries are removed when the cache exceeds `max_bytes`.
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'{get_cache_key(fname)}.npz')
+    entry = _load_entry(path)
+    if entry is not None:
+        touch(path)
+        return entry
+    tree, stats = read_tree_arrays_and_stats_fbl(fname)
+    atomic_write(path, _make_entry(fname, stats))
+    evict_lru(cache_dir, max_bytes)
+    return tree, stats
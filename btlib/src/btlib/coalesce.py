@@ -0,0 +1,81 @@
+"""Merge fast state updates into frames of a bounded rate."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import Counter
+import threading
+from typing import Any, Dict, Mapping, NamedTuple
+
+# frames per second that downstream renderers and clients get at most
+DEFAULT_RATE_HZ = 30.
+
+
+class Frame(NamedTuple):
+    """The state changes of one frame."""
+
+    # latest state per node that changed in the frame
+    states: Dict[int, Any]
+    # number of state changes per node, including the dropped ones
+    transitions: Dict[int, int]
+    # number of state changes that were replaced before the frame ended
+    dropped: int
+
+
+class Coalescer:
+    """
+    Collect the state changes of nodes until the next frame.
+
+    Only the latest state of each node is kept. A state that is replaced
+    before the frame is flushed counts as a dropped transition. Call
+    `flush` every `period_s` seconds, e.g. from a timer, to get the frames.
+    `add` and `flush` can be called from different threads.
+    """
+
+    def __init__(self, rate_hz: float = DEFAULT_RATE_HZ):
+        if rate_hz <= 0:
+            raise ValueError(f'Rate must be positive, got {rate_hz}')
+        self.rate_hz = rate_hz
+        self.period_s = 1. / rate_hz
+        self.dropped_total = 0
+        self._pending: Dict[int, Any] = {}
+        self._transitions: Counter = Counter()
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, states: Mapping[int, Any]):
+        """
+        Add the new states of some nodes to the current frame.
+
+        :param states: State per node id.
+        """
+        with self._lock:
+            for node, state in states.items():
+                if node in self._pending:
+                    self._dropped += 1
+                self._pending[node] = state
+                self._transitions[node] += 1
+
+    def flush(self) -> Frame:
+        """
+        End the current frame.
+
+        :return: The states, the number of transitions per node and the
+            number of dropped transitions of the frame.
+        """
+        with self._lock:
+            states, self._pending = self._pending, {}
+            transitions, self._transitions = self._transitions, Counter()
+            dropped, self._dropped = self._dropped, 0
+            self.dropped_total += dropped
+        return Frame(states, dict(transitions), dropped)
@@ -18,7 +18,10 @@ import logging
 logger = logging.getLogger(__name__)
 
 # node categories
-NODE_CAT = Enum('NODECAT', 'ROOT LEAF DECORATOR CONTROL SUBTREE')
+# (`qualname` makes them picklable, e.g. to send them to worker processes)
+NODE_CAT = Enum('NODECAT', 'ROOT LEAF DECORATOR CONTROL SUBTREE',
+                module=__name__, qualname='NODE_CAT')
 
 # node states
-NODE_STATE = Enum('RETURN_STATE', 'SUCCESS FAILURE RUNNING IDLE')
+NODE_STATE = Enum('RETURN_STATE', 'SUCCESS FAILURE RUNNING IDLE',
+                  module=__name__, qualname='NODE_STATE')
@@ -12,10 +12,48 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from contextlib import contextmanager
+import hashlib
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
 from btlib.common import NODE_CAT, NODE_STATE
-from btlib.Serialization.BehaviorTree import BehaviorTree
 from btlib.Serialization.NodeStatus import NodeStatus
 import networkx as nx
+import numpy as np
+
+# all offsets are defined in https://github.com/BehaviorTree/BehaviorTree.\
+# CPP/blob/9f0a969eb929a86e754498d1a1cde8037b2b6f13/tools/bt_log_cat.cpp#L99
+RECORD_DTYPE = np.dtype([
+    ('t_sec', '<u4'),
+    ('t_usec', '<u4'),
+    ('uid', '<u2'),
+    ('prev_status', 'i1'),
+    ('status', 'i1'),
+])
+RECORD_SIZE = RECORD_DTYPE.itemsize
+# number of records processed at once when iterating over a log
+CHUNK_RECORDS = 1_000_000
+# graph attribute with a hash of the tree structure, see `read_bt`
+FINGERPRINT = 'fingerprint'
+
+# vtable offsets of the fields used by `read_bt_arrays`, as in the
+# generated code in `btlib.Serialization`
+BEHAVIOR_TREE_FIELDS = (
+    4,  # root_uid
+    6,  # nodes
+)
+TREE_NODE_FIELDS = (
+    4,  # uid
+    6,  # children_uid
+    10,  # instance_name
+    12,  # registration_name
+)
+_INT32 = struct.Struct('<i')
+_UINT16 = struct.Struct('<H')
+_UINT32 = struct.Struct('<I')
 
 
 def state_from_status(s: NodeStatus) -> NODE_STATE:
@@ -30,44 +68,290 @@ def state_from_status(s: NodeStatus) -> NODE_STATE:
     raise ValueError('Unknown state')
 
 
-def read_bt(buffer) -> nx.Graph:
-    g = nx.DiGraph()
-    bt = BehaviorTree.GetRootAsBehaviorTree(buffer, 4)
-    root = bt.RootUid()
-    n_nodes = bt.NodesLength()
-    print(f'{n_nodes=}')
-    nodes = [
-        bt.Nodes(i) for i in range(n_nodes)
+# index of the `NODE_STATE` (`NODE_STATE.value - 1`) per `NodeStatus`
+STATE_INDEX_PER_STATUS = np.array([
+    state_from_status(s).value - 1 for s in [  # type: ignore
+        NodeStatus.IDLE,
+        NodeStatus.RUNNING,
+        NodeStatus.SUCCESS,
+        NodeStatus.FAILURE,
     ]
-    for node in nodes:
-        g.add_node(
-            node.Uid(),
-            NAME=node.InstanceName().decode())
-    g.nodes()[root]['category'] = NODE_CAT.ROOT
-    for node in nodes:
-        for n, child in enumerate(
-            [node.ChildrenUid(i)
-             for i in range(node.ChildrenUidLength())]):
-            g.add_edge(node.Uid(), child, label=n)
+], dtype=np.intp)
+
+
+class TreeArrays(NamedTuple):
+    """Structure of a behavior tree, see `read_bt_arrays`."""
+
+    root: int
+    # per node, in the order of the file
+    uids: np.ndarray
+    instance_names: List[Optional[bytes]]
+    registration_names: List[Optional[bytes]]
+    # per edge, ordered by parent and then by position of the child
+    parents: np.ndarray
+    children: np.ndarray
+    child_indices: np.ndarray
+
+
+def _get_fields(buffer, table: int, vtable_offsets: Tuple[int, ...],
+                cache: Dict[int, Tuple[int, ...]]) -> Tuple[int, ...]:
+    """
+    Get the positions of fields in a flatbuffer table.
+
+    Tables written by the same builder usually share their vtable, so the
+    offsets are cached per vtable.
+
+    :return: Position of each field, 0 for fields that are not present.
+    """
+    vtable = table - _INT32.unpack_from(buffer, table)[0]
+    if vtable not in cache:
+        vtable_size = _UINT16.unpack_from(buffer, vtable)[0]
+        cache[vtable] = tuple(
+            _UINT16.unpack_from(buffer, vtable + o)[0]
+            if o < vtable_size else 0
+            for o in vtable_offsets)
+    return tuple(table + o if o else 0 for o in cache[vtable])
+
+
+def _get_string(buffer, field: int) -> Optional[bytes]:
+    if not field:
+        return None
+    start = field + _UINT32.unpack_from(buffer, field)[0]
+    length = _UINT32.unpack_from(buffer, start)[0]
+    return bytes(buffer[start + 4:start + 4 + length])
+
+
+def _get_vector(buffer, field: int, dtype: str) -> np.ndarray:
+    """Get a vector of scalars without copying, like `GetVectorAsNumpy`."""
+    if not field:
+        return np.empty(0, dtype=dtype)
+    start = field + _UINT32.unpack_from(buffer, field)[0]
+    length = _UINT32.unpack_from(buffer, start)[0]
+    return np.frombuffer(buffer, dtype=dtype, count=length, offset=start + 4)
+
+
+def read_bt_arrays(buffer) -> TreeArrays:
+    """
+    Read the structure of the behavior tree from the start of a fbl buffer.
+
+    This reads the flatbuffer directly, without creating objects of the
+    generated classes per node. The children of a node are read at once,
+    like `TreeNode.ChildrenUidAsNumpy` does. No graph is built, use
+    `tree_arrays_to_networkx` for that.
+    """
+    vtable_cache: Dict[int, Tuple[int, ...]] = {}
+    bt = 4 + _UINT32.unpack_from(buffer, 4)[0]
+    root_field, nodes_field = _get_fields(
+        buffer, bt, BEHAVIOR_TREE_FIELDS, vtable_cache)
+    root = _UINT16.unpack_from(buffer, root_field)[0] if root_field else 0
+    node_offsets = _get_vector(buffer, nodes_field, '<u4')
+    if len(node_offsets):
+        nodes_start = nodes_field + _UINT32.unpack_from(
+            buffer, nodes_field)[0] + 4
+        node_offsets = node_offsets.astype(np.int64) + (
+            nodes_start + 4 * np.arange(len(node_offsets)))
+
+    uids = np.zeros(len(node_offsets), dtype=np.int64)
+    instance_names = []
+    registration_names = []
+    children = []
+    for i, table in enumerate(node_offsets.tolist()):
+        uid_field, children_field, instance_field, registration_field = \
+            _get_fields(buffer, table, TREE_NODE_FIELDS, vtable_cache)
+        if uid_field:
+            uids[i] = _UINT16.unpack_from(buffer, uid_field)[0]
+        children.append(_get_vector(buffer, children_field, '<u2'))
+        instance_names.append(_get_string(buffer, instance_field))
+        registration_names.append(_get_string(buffer, registration_field))
+
+    n_children = np.array([len(c) for c in children], dtype=np.int64)
+    n_edges = int(n_children.sum())
+    edge_start = np.repeat(np.cumsum(n_children) - n_children, n_children)
+    return TreeArrays(
+        root=root,
+        uids=uids,
+        instance_names=instance_names,
+        registration_names=registration_names,
+        parents=np.repeat(uids, n_children),
+        children=np.concatenate(
+            children).astype(np.int64) if n_edges else np.empty(0, np.int64),
+        child_indices=np.arange(n_edges) - edge_start,
+    )
+
+
+def get_fingerprint(tree: TreeArrays) -> str:
+    """
+    Hash uid, instance name, registration name and children of all nodes.
+
+    Two trees with the same fingerprint have the same structure.
+    """
+    children_per_uid: Dict[int, List[int]] = {
+        uid: [] for uid in tree.uids.tolist()}
+    for parent, child in zip(tree.parents.tolist(), tree.children.tolist()):
+        children_per_uid[parent].append(child)
+    fingerprint_per_uid = sorted(
+        (uid, (instance_name, registration_name, children_per_uid[uid]))
+        for uid, instance_name, registration_name in zip(
+            tree.uids.tolist(),
+            tree.instance_names,
+            tree.registration_names))
+    fingerprint = hashlib.blake2b(repr((
+        tree.root, fingerprint_per_uid)).encode(), digest_size=16)
+    return fingerprint.hexdigest()
+
+
+def tree_arrays_to_networkx(tree: TreeArrays) -> nx.Graph:
+    """Build the graph of a behavior tree, see `read_bt`."""
+    g = nx.DiGraph()
+    g.add_nodes_from(
+        (uid, {'NAME': (instance_name or b'').decode()})
+        for uid, instance_name in zip(
+            tree.uids.tolist(), tree.instance_names))
+    g.nodes()[tree.root]['category'] = NODE_CAT.ROOT
+    g.add_edges_from(
+        (parent, child, {'label': n})
+        for parent, child, n in zip(
+            tree.parents.tolist(),
+            tree.children.tolist(),
+            tree.child_indices.tolist()))
+    g.graph[FINGERPRINT] = get_fingerprint(tree)
     return g
 
 
+def read_bt(buffer) -> nx.Graph:
+    """
+    Read the behavior tree from the start of a fbl buffer.
+
+    The graph attribute `FINGERPRINT` is a hash of the structure of the tree,
+    see `get_fingerprint`.
+    """
+    return tree_arrays_to_networkx(read_bt_arrays(buffer))
+
+
+@contextmanager
+def open_fbl(fname: str) -> Iterator[memoryview]:
+    """
+    Map a fbl file into memory.
+
+    The file is not read into RAM, pages are only loaded when they are
+    accessed. Views (e.g. from `read_records`) on the buffer stay valid
+    after leaving the context, the map is then closed when the last view
+    is garbage collected. An empty file gives an empty buffer.
+
+    :param fname: Path to the fbl file.
+
+    :return: Read-only buffer with the content of the file.
+    """
+    with open(fname, 'rb') as file_b:
+        if os.fstat(file_b.fileno()).st_size == 0:
+            # empty files, e.g. of a run that just started, can not be mapped
+            yield memoryview(b'')
+            return
+        mm = mmap.mmap(file_b.fileno(), 0, access=mmap.ACCESS_READ)
+    buf = memoryview(mm)
+    try:
+        yield buf
+    finally:
+        try:
+            buf.release()
+            mm.close()
+        except BufferError:
+            # views on the buffer are still referenced, they keep the map
+            # open until they are garbage collected
+            pass
+
+
+def get_header_size(buffer) -> int:
+    """Get the size of the serialized tree at the start of a fbl buffer."""
+    return int.from_bytes(buffer[:4], byteorder='little')
+
+
+def read_records(buffer) -> np.ndarray:
+    """
+    Interpret the state changes of a fbl buffer as structured array.
+
+    The returned array is a view on `buffer`, nothing is copied.
+    An incomplete record at the end of the buffer is ignored.
+
+    :param buffer: Content of a fbl file.
+
+    :return: Array of `RECORD_DTYPE`.
+    """
+    offset = get_header_size(buffer) + 4
+    n_records = max(len(buffer) - offset, 0) // RECORD_SIZE
+    if n_records == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.frombuffer(
+        buffer, dtype=RECORD_DTYPE, count=n_records, offset=offset)
+
+
+def iter_record_chunks(
+    records: np.ndarray,
+    chunk_records: int = CHUNK_RECORDS
+) -> Iterator[np.ndarray]:
+    """Split records into views of at most `chunk_records` records."""
+    assert chunk_records > 0, 'Chunks must contain at least one record'
+    for start in range(0, len(records), chunk_records):
+        yield records[start:start + chunk_records]
+
+
+def iter_log_chunks(
+    fname: str,
+    chunk_records: int = CHUNK_RECORDS
+) -> Iterator[np.ndarray]:
+    """
+    Iterate over the state changes of a fbl file in batches.
+
+    The file is read lazily, so only one batch is in memory at a time and
+    the first batch is available before the whole file has been read.
+    An incomplete record at the end of the file is ignored.
+
+    :param fname: Path to the fbl file.
+    :param chunk_records: Maximum number of records per batch.
+
+    :return: Iterator over arrays of `RECORD_DTYPE`.
+    """
+    assert chunk_records > 0, 'Chunks must contain at least one record'
+    with open(fname, 'rb') as file_b:
+        header_size = get_header_size(file_b.read(4))
+        file_b.seek(header_size, os.SEEK_CUR)
+        while True:
+            chunk = file_b.read(chunk_records * RECORD_SIZE)
+            n_records = len(chunk) // RECORD_SIZE
+            if n_records > 0:
+                yield np.frombuffer(
+                    chunk, dtype=RECORD_DTYPE, count=n_records)
+            if n_records < chunk_records:
+                return
+
+
+def get_state_indices(
+    records: np.ndarray,
+    field: str = 'status'
+) -> np.ndarray:
+    """
+    Get the index of the `NODE_STATE` of each record.
+
+    :param records: State changes as returned by `read_records`.
+    :param field: `status` for the new or `prev_status` for the previous
+        state.
+    """
+    status = records[field]
+    if np.any((status < 0) | (status >= len(STATE_INDEX_PER_STATUS))):
+        raise ValueError('Unknown state')
+    return STATE_INDEX_PER_STATUS[status]
+
+
+def get_timestamps(records: np.ndarray) -> np.ndarray:
+    """Get the time of each record in microseconds since epoch."""
+    return records['t_sec'].astype(np.int64) * 1_000_000 + records['t_usec']
+
+
 def read_log(buffer):
-    ENDIAN = 'little'
-    header_size = int.from_bytes(buffer[:2], byteorder=ENDIAN)
-    index = header_size + 4
-    # all offsets are defined in https://github.com/BehaviorTree/BehaviorTree.\
-    # CPP/blob/9f0a969eb929a86e754498d1a1cde8037b2b6f13/tools/bt_log_cat.cpp#L99
-    log = []
-    while index < len(buffer):
-        uid = int.from_bytes(buffer[index + 8:index + 10], ENDIAN)
-        # TODO: Can we also interpret the `state_1`?
-        # status_1 = int.from_bytes(buffer[index + 10:index + 11], ENDIAN)
-        status_2 = int.from_bytes(buffer[index + 11:index + 12], ENDIAN)
-        # TODO: Implementation of timing analysis
-        log.append((
-            uid,
-            state_from_status(status_2)
-        ))
-        index += 12
-    return log
+    records = read_records(buffer)
+    return [
+        (uid, NODE_STATE(state_index + 1))
+        for uid, state_index in zip(
+            records['uid'].tolist(),
+            get_state_indices(records).tolist())
+    ]
@@ -0,0 +1,110 @@
+"""Incremental reading of fbl files that are still being written."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import time
+from typing import Iterator, Optional
+
+from btlib.fbl_reader import (CHUNK_RECORDS, get_header_size,
+                              read_bt_arrays, RECORD_DTYPE, RECORD_SIZE,
+                              tree_arrays_to_networkx, TreeArrays)
+from btlib.stats import NodeStats
+import networkx as nx
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FblFollower:
+    """
+    Follow a fbl file while BehaviorTree.CPP appends state changes to it.
+
+    Every call to `poll` reads only the complete records that were appended
+    since the previous call and adds them to `stats`. If the file is
+    truncated, e.g. because a new run started, reading restarts from the
+    beginning with new stats.
+    """
+
+    def __init__(self, fname: str):
+        self.fname = fname
+        self.tree: Optional[TreeArrays] = None
+        self._g: Optional[nx.Graph] = None
+        self.stats: Optional[NodeStats] = None
+        self.n_records = 0
+        # position of the next record in the file, known once the tree
+        # has been read
+        self._offset: Optional[int] = None
+
+    @property
+    def g(self) -> Optional[nx.Graph]:
+        """The graph of the tree, built when it is first needed."""
+        if self._g is None and self.tree is not None:
+            self._g = tree_arrays_to_networkx(self.tree)
+        return self._g
+
+    def _reset(self):
+        self.tree = None
+        self._g = None
+        self.stats = None
+        self.n_records = 0
+        self._offset = None
+
+    def _read_tree(self, file_b) -> bool:
+        header = file_b.read(4)
+        if len(header) < 4:
+            return False
+        header_size = get_header_size(header)
+        tree = file_b.read(header_size)
+        if len(tree) < header_size:
+            return False
+        self.tree = read_bt_arrays(header + tree)
+        self.stats = NodeStats(self.tree.uids)
+        self._offset = 4 + header_size
+        return True
+
+    def poll(self, max_records: int = CHUNK_RECORDS) -> np.ndarray:
+        """
+        Read the records appended since the last call.
+
+        :param max_records: Maximum number of records to read at once, the
+            rest is read by the next call.
+
+        :return: The new records, also counted in `stats`.
+        """
+        with open(self.fname, 'rb') as file_b:
+            size = os.fstat(file_b.fileno()).st_size
+            if self._offset is not None and size < self._offset:
+                logger.info(f'{self.fname} was truncated, reading it again')
+                self._reset()
+            if self._offset is None and not self._read_tree(file_b):
+                return np.empty(0, dtype=RECORD_DTYPE)
+            assert self._offset is not None
+            assert self.stats is not None
+            n_records = min((size - self._offset) // RECORD_SIZE, max_records)
+            file_b.seek(self._offset)
+            data = file_b.read(n_records * RECORD_SIZE)
+        n_records = len(data) // RECORD_SIZE
+        records = np.frombuffer(data, dtype=RECORD_DTYPE, count=n_records)
+        self.stats.add_records(records)
+        self._offset += n_records * RECORD_SIZE
+        self.n_records += n_records
+        return records
+
+    def follow(self, period_s: float = 1.) -> Iterator[np.ndarray]:
+        """Poll the file every `period_s` seconds, forever."""
+        while True:
+            yield self.poll()
+            time.sleep(period_s)
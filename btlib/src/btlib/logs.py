@@ -14,12 +14,17 @@
 # limitations under the License.
 
 import logging
-from typing import Optional, Tuple, Union
+from typing import Iterable, Optional, Tuple, Union
 
 from btlib import VALUE_MAP, VALUE_MAP_RETURN_STATES
 from btlib.common import NODE_STATE
-from btlib.fbl_reader import read_log
+from btlib.fbl_reader import (get_state_indices, iter_log_chunks,
+                              iter_record_chunks, open_fbl, read_bt,
+                              read_bt_arrays, read_records,
+                              tree_arrays_to_networkx, TreeArrays)
+from btlib.stats import NodeStats
 import networkx as nx
+import numpy as np
 
 
 logger = logging.getLogger(__name__)
@@ -44,6 +49,52 @@ def _get_id_and_state_from_line(line: str) -> Tuple[int, NODE_STATE]:
         raise ValueError(f'Could not parse line {line}') from e
 
 
+def count_states(records: np.ndarray, n_uids: int = 0) -> np.ndarray:
+    """
+    Count how often each node changed to each state.
+
+    :param records: State changes as returned by `read_records`.
+    :param n_uids: Minimum number of rows in the output.
+
+    :return: Array of shape `(max(n_uids, max uid + 1), len(NODE_STATE))`
+        where `[uid, rs.value - 1]` is how often node `uid` changed to `rs`.
+    """
+    n_states = len(NODE_STATE)
+    if len(records):
+        n_uids = max(n_uids, int(records['uid'].max()) + 1)
+    flat_index = records['uid'].astype(np.intp) * n_states
+    flat_index += get_state_indices(records)
+    return np.bincount(
+        flat_index, minlength=n_uids * n_states
+    ).reshape(n_uids, n_states)
+
+
+def fold_state_counts(
+    chunks: Iterable[np.ndarray],
+    n_uids: int = 0
+) -> np.ndarray:
+    """
+    Count the states over batches of records.
+
+    Only one batch is processed at a time, so this works in constant memory
+    for logs of any length.
+
+    :param chunks: Batches of records, e.g. from `iter_log_chunks`.
+    :param n_uids: Minimum number of rows in the output.
+
+    :return: Same as `count_states` for all records.
+    """
+    state_counts = np.zeros((n_uids, len(NODE_STATE)), dtype=np.int64)
+    for records in chunks:
+        chunk_counts = count_states(records, len(state_counts))
+        if len(chunk_counts) > len(state_counts):
+            state_counts = np.pad(
+                state_counts,
+                ((0, len(chunk_counts) - len(state_counts)), (0, 0)))
+        state_counts += chunk_counts
+    return state_counts
+
+
 def read_log_fbl(fname: str,
                  g: nx.Graph) -> Tuple[VALUE_MAP, VALUE_MAP_RETURN_STATES]:
     """
@@ -57,32 +108,84 @@ def read_log_fbl(fname: str,
         `values_success`: How often a node was successful (positive value)
         vs failed (negative value).
     """
-    with open(fname, 'rb') as file_b:
-        buf = bytearray(file_b.read())
-        log = read_log(buf)
-    values_count: VALUE_MAP = {id_: None for id_ in g.nodes()}
-    values_state_counts: VALUE_MAP_RETURN_STATES = {
-        id_: None for id_ in g.nodes()
-    }
-    for id_, rs in log:
-        assert id_ is not None, 'Id must not be None'
-        if values_count[id_] is None:
-            values_count[id_] = 0
-        values_count[id_] += 1  # type: ignore
-        if values_state_counts[id_] is None:
-            values_state_counts[id_] = [0 for _ in NODE_STATE]
-        values_state_counts[id_][rs.value - 1] += 1  # type: ignore
+    n_uids = max(g.nodes(), default=-1) + 1
+    state_counts = fold_state_counts(iter_log_chunks(fname), n_uids)
+    return to_value_maps(g, state_counts)
+
+
+def read_tree_and_state_counts_fbl(fname: str) -> Tuple[nx.Graph, np.ndarray]:
+    """
+    Read the tree and the state counts from one log file.
+
+    This opens the file only once.
+
+    :return: Tuple of the graph and the output of `count_states`.
+    """
+    with open_fbl(fname) as buf:
+        g = read_bt(buf)
+        n_uids = max(g.nodes(), default=-1) + 1
+        state_counts = fold_state_counts(
+            iter_record_chunks(read_records(buf)), n_uids)
+    return g, state_counts
+
+
+def read_tree_arrays_and_stats_fbl(
+    fname: str
+) -> Tuple[TreeArrays, NodeStats]:
+    """
+    Read the structure of the tree and the `NodeStats` of its nodes.
+
+    No graph is built, see `read_stats_fbl` for that.
+    """
+    with open_fbl(fname) as buf:
+        tree = read_bt_arrays(buf)
+        stats = NodeStats(tree.uids)
+        stats.add_record_chunks(iter_record_chunks(read_records(buf)))
+    return tree, stats
+
+
+def read_stats_fbl(fname: str) -> Tuple[nx.Graph, NodeStats]:
+    """Read the tree and the `NodeStats` of its nodes from one log file."""
+    tree, stats = read_tree_arrays_and_stats_fbl(fname)
+    return tree_arrays_to_networkx(tree), stats
+
+
+def read_tree_and_log_fbl(fname: str) -> Tuple[
+        nx.Graph, VALUE_MAP, VALUE_MAP_RETURN_STATES]:
+    """
+    Read the tree and the values per node from one log file.
+
+    This opens the file only once, see `read_log_fbl` for the values.
+    """
+    g, state_counts = read_tree_and_state_counts_fbl(fname)
+    return (g, *to_value_maps(g, state_counts))
+
+
+def to_value_maps(
+    g: nx.Graph,
+    state_counts: np.ndarray
+) -> Tuple[VALUE_MAP, VALUE_MAP_RETURN_STATES]:
+    """Convert the output of `count_states` to value maps."""
+    values_count: VALUE_MAP = dict.fromkeys(g.nodes())
+    values_state_counts: VALUE_MAP_RETURN_STATES = dict.fromkeys(g.nodes())
+    counts_per_uid = state_counts.sum(axis=1).tolist()
+    for id_ in g.nodes():
+        if counts_per_uid[id_] == 0:
+            continue
+        values_count[id_] = counts_per_uid[id_]
+        values_state_counts[id_] = state_counts[id_].tolist()
     return values_count, values_state_counts
 
 
 def merge_values(
-    values1: Optional[Union[VALUE_MAP, VALUE_MAP_RETURN_STATES]],
-    values2: Optional[Union[VALUE_MAP, VALUE_MAP_RETURN_STATES]]) -> \
-        Union[VALUE_MAP, VALUE_MAP_RETURN_STATES]:
+    values1: Optional[Union[VALUE_MAP, VALUE_MAP_RETURN_STATES, NodeStats]],
+    values2: Optional[Union[VALUE_MAP, VALUE_MAP_RETURN_STATES, NodeStats]]
+) -> Union[VALUE_MAP, VALUE_MAP_RETURN_STATES, NodeStats]:
     """
     Merge values of two value maps.
 
     On the lowest level this will add the two values if they are present.
+    Two `NodeStats` are merged by adding their counts.
     """
     if values1 is None:
         assert values2 is not None, 'At least one values must not be None'
@@ -90,6 +193,9 @@ def merge_values(
     if values2 is None:
         assert values1 is not None, 'At least one values must not be None'
         return values1
+    if isinstance(values1, NodeStats):
+        assert isinstance(values2, NodeStats), 'Values must be of same type'
+        return values1 + values2
     assert len(values1) == len(values2), 'Values must have same length'
     values_out: Union[VALUE_MAP, VALUE_MAP_RETURN_STATES] = {}  # type: ignore
     for id_ in values1:
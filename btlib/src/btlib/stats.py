@@ -0,0 +1,197 @@
+"""Compact state counts per node of a behavior tree."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import (Dict, Iterable, Iterator, List, Optional, Sequence,
+                    Tuple, Union)
+
+from btlib import VALUE_MAP, VALUE_MAP_RETURN_STATES
+from btlib.common import NODE_STATE
+from btlib.fbl_reader import get_state_indices
+import numpy as np
+
+UIDS = Union[Sequence[int], np.ndarray]
+
+
+def merge_state_counts(state_counts: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Merge state count arrays of many logs.
+
+    The counts are added pairwise in a tree, so that partial sums of
+    similar size are added. Arrays may have different numbers of rows.
+    """
+    assert len(state_counts) > 0, 'At least one state count must be given'
+    level: List[np.ndarray] = list(state_counts)
+    while len(level) > 1:
+        next_level = []
+        for a, b in zip(level[::2], level[1::2]):
+            if len(a) < len(b):
+                a, b = b, a
+            merged = a.copy()
+            merged[:len(b)] += b
+            next_level.append(merged)
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0]
+
+
+class NodeStats:
+    """
+    How often each node of a behavior tree changed to each state.
+
+    The counts are stored in one `(n_nodes, len(NODE_STATE))` matrix where
+    `counts[row, rs.value - 1]` belongs to the node `uids[row]`.
+    This can be used in place of a `VALUE_MAP_RETURN_STATES`:
+    `stats[uid]` is `None` for nodes that were never ticked.
+    """
+
+    def __init__(self, uids: UIDS,
+                 counts: Optional[np.ndarray] = None):
+        self.uids = np.asarray(uids, dtype=np.int64)
+        assert len(np.unique(self.uids)) == len(self.uids), \
+            'Uids must be unique'
+        assert len(self.uids) == 0 or self.uids.min() >= 0, \
+            'Uids must not be negative'
+        self._row_per_uid = np.full(
+            int(self.uids.max(initial=-1)) + 1, -1, dtype=np.intp)
+        self._row_per_uid[self.uids] = np.arange(len(self.uids))
+        if counts is None:
+            counts = np.zeros((len(self.uids), len(NODE_STATE)), np.int64)
+        assert counts.shape == (len(self.uids), len(NODE_STATE)), \
+            f'Counts must have shape {(len(self.uids), len(NODE_STATE))}'
+        self.counts = counts.astype(np.int64, copy=False)
+
+    @classmethod
+    def from_state_counts(cls, uids: UIDS,
+                          state_counts: np.ndarray) -> 'NodeStats':
+        """Make stats from an array indexed by uid, e.g. `count_states`."""
+        uids_array = np.asarray(uids, dtype=np.int64)
+        counts = np.zeros((len(uids_array), len(NODE_STATE)), dtype=np.int64)
+        known = uids_array < len(state_counts)
+        counts[known] = state_counts[uids_array[known]]
+        return cls(uids_array, counts)
+
+    @classmethod
+    def merge(cls, stats: Sequence['NodeStats']) -> 'NodeStats':
+        """Merge the stats of many logs of the same tree."""
+        assert len(stats) > 0, 'At least one stats must be given'
+        for s in stats[1:]:
+            assert np.array_equal(s.uids, stats[0].uids), \
+                'Stats must be of the same nodes'
+        return cls(
+            stats[0].uids,
+            merge_state_counts([s.counts for s in stats]))
+
+    def rows(self, uids: UIDS) -> np.ndarray:
+        """Get the row of each uid, -1 for uids that are not in the tree."""
+        uids = np.asarray(uids, dtype=np.intp)
+        rows = np.full(len(uids), -1, dtype=np.intp)
+        in_range = uids < len(self._row_per_uid)
+        rows[in_range] = self._row_per_uid[uids[in_range]]
+        return rows
+
+    def select(self, uids: UIDS) -> 'NodeStats':
+        """
+        Get the stats of some nodes, e.g. of a subtree.
+
+        :param uids: The uids, in the order of the result. Every uid must be
+            in these stats.
+        """
+        rows = self.rows(uids)
+        assert (rows >= 0).all(), 'Uids must be in the stats'
+        return NodeStats(uids, self.counts[rows])
+
+    def aggregate(self, members: Dict[int, UIDS]) -> 'NodeStats':
+        """
+        Sum up the counts of groups of nodes, e.g. of collapsed subtrees.
+
+        :param members: The uids whose counts are summed up per uid of the
+            result. Every uid must be in these stats.
+        :return: Stats of the uids that are keys of `members`.
+        """
+        counts = np.zeros((len(members), len(NODE_STATE)), dtype=np.int64)
+        for i_group, uids in enumerate(members.values()):
+            rows = self.rows(uids)
+            assert (rows >= 0).all(), 'Uids must be in the stats'
+            counts[i_group] = self.counts[rows].sum(axis=0)
+        return NodeStats(list(members.keys()), counts)
+
+    def add_records(self, records: np.ndarray):
+        """Count the state changes of records, e.g. from `read_records`."""
+        rows = self.rows(records['uid'])
+        known = rows >= 0
+        n_states = len(NODE_STATE)
+        flat_index = rows[known] * n_states
+        flat_index += get_state_indices(records[known])
+        self.counts += np.bincount(
+            flat_index, minlength=self.counts.size
+        ).reshape(self.counts.shape)
+
+    def add_record_chunks(self, chunks: Iterable[np.ndarray]):
+        """Count the state changes of batches of records."""
+        for records in chunks:
+            self.add_records(records)
+
+    @property
+    def totals(self) -> np.ndarray:
+        """How often each node changed its state."""
+        return self.counts.sum(axis=1)
+
+    @property
+    def never_ticked(self) -> np.ndarray:
+        """Mask of the nodes that never changed their state."""
+        return self.totals == 0
+
+    def __add__(self, other: 'NodeStats') -> 'NodeStats':
+        assert np.array_equal(self.uids, other.uids), \
+            'Stats must be of the same nodes'
+        return NodeStats(self.uids, self.counts + other.counts)
+
+    def __len__(self) -> int:
+        return len(self.uids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.uids.tolist())
+
+    def __contains__(self, uid: object) -> bool:
+        if not isinstance(uid, (int, np.integer)):
+            return False
+        return 0 <= int(uid) < len(self._row_per_uid) and \
+            bool(self._row_per_uid[uid] >= 0)
+
+    def __getitem__(self, uid: int) -> Optional[List[int]]:
+        if uid not in self:
+            raise KeyError(uid)
+        row = self._row_per_uid[uid]
+        if not self.counts[row].any():
+            return None
+        return self.counts[row].tolist()
+
+    def get_counts(self) -> VALUE_MAP:
+        """Get how often each node was executed as value map."""
+        totals = self.totals.tolist()
+        return {
+            uid: total if total > 0 else None
+            for uid, total in zip(self.uids.tolist(), totals)
+        }
+
+    def to_value_maps(self) -> Tuple[VALUE_MAP, VALUE_MAP_RETURN_STATES]:
+        """Convert to value maps, see `btlib.logs.read_log_fbl`."""
+        never_ticked = self.never_ticked.tolist()
+        counts = self.counts.tolist()
+        return self.get_counts(), {
+            uid: None if never_ticked[row] else counts[row]
+            for row, uid in enumerate(self.uids.tolist())
+        }
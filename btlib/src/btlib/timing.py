@@ -0,0 +1,196 @@
+"""Timing analysis of behavior tree executions from fbl logs."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from btlib.common import NODE_STATE
+from btlib.fbl_reader import (get_state_indices, get_timestamps, open_fbl,
+                              read_records)
+import networkx as nx
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+IDLE = NODE_STATE.IDLE.value - 1
+RUNNING = NODE_STATE.RUNNING.value - 1
+SUCCESS = NODE_STATE.SUCCESS.value - 1
+FAILURE = NODE_STATE.FAILURE.value - 1
+
+
+class NodeTiming(NamedTuple):
+    """
+    Timing of one node, all durations are in seconds.
+
+    An execution starts when the node leaves IDLE or starts RUNNING and ends
+    when it returns SUCCESS or FAILURE. Values that depend on completed executions are
+    `nan` if there were none.
+    """
+
+    n_executions: int
+    mean_s: float
+    p50_s: float
+    p95_s: float
+    p99_s: float
+    running_s: float
+
+
+TIMING_MAP = Dict[int, Optional[NodeTiming]]
+
+
+def _group_percentiles(
+    groups: np.ndarray,
+    values: np.ndarray,
+    n_groups: int,
+    percentiles: Tuple[int, ...]
+) -> np.ndarray:
+    """
+    Compute percentiles of values per group at once.
+
+    Uses linear interpolation like `np.percentile`.
+
+    :return: Array of shape `(n_groups, len(percentiles))`, `nan` for empty
+        groups.
+    """
+    order = np.lexsort((values, groups))
+    values_sorted = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    out = np.full((n_groups, len(percentiles)), np.nan)
+    has_values = counts > 0
+    for i_p, p in enumerate(percentiles):
+        pos = (counts[has_values] - 1) * p / 100
+        lower = np.floor(pos).astype(np.intp)
+        upper = np.ceil(pos).astype(np.intp)
+        v_lower = values_sorted[offsets[has_values] + lower]
+        v_upper = values_sorted[offsets[has_values] + upper]
+        out[has_values, i_p] = v_lower + (v_upper - v_lower) * (pos - lower)
+    return out
+
+
+def get_durations(records: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the duration of each completed execution of every node.
+
+    :param records: State changes in chronological order, as returned by
+        `read_records`.
+
+    :return: Tuple of
+        `uids`: Node of each execution.
+        `durations`: Duration of each execution in microseconds.
+    """
+    order = np.argsort(records['uid'], kind='stable')
+    uids = records['uid'][order]
+    times = get_timestamps(records)[order]
+    prev_states = get_state_indices(records, 'prev_status')[order]
+    states = get_state_indices(records)[order]
+
+    n = len(uids)
+    index = np.arange(n)
+    first_of_group = np.ones(n, dtype=bool)
+    first_of_group[1:] = uids[1:] != uids[:-1]
+    group_start = np.maximum.accumulate(np.where(first_of_group, index, 0))
+    is_end = (states == SUCCESS) | (states == FAILURE)
+    is_start = ((prev_states == IDLE) & (states != IDLE)) | (
+        states == RUNNING)
+    # an execution is open from its first start until the node returns or
+    # goes back to IDLE, later starts and ends without a start are ignored
+    is_reset = is_end | (states == IDLE)
+    last_reset = np.maximum.accumulate(np.where(is_reset, index, -1))
+    prev_reset = np.empty(n, dtype=np.intp)
+    prev_reset[:1] = -1
+    prev_reset[1:] = last_reset[:-1]
+    prev_reset = np.maximum(prev_reset, group_start - 1)
+    next_start = np.minimum.accumulate(
+        np.where(is_start, index, n)[::-1])[::-1]
+    open_start = next_start[prev_reset + 1]
+    is_end &= open_start <= index
+    return uids[is_end], times[is_end] - times[open_start[is_end]]
+
+
+def get_running_times(records: np.ndarray, n_uids: int = 0) -> np.ndarray:
+    """
+    Get the total time each node spent in RUNNING.
+
+    :param records: State changes in chronological order.
+    :param n_uids: Minimum length of the output.
+
+    :return: Time in microseconds per uid.
+    """
+    order = np.argsort(records['uid'], kind='stable')
+    uids = records['uid'][order]
+    times = get_timestamps(records)[order]
+    states = get_state_indices(records)[order]
+    # a node is running until its next state change
+    is_running = (states[:-1] == RUNNING) & (uids[:-1] == uids[1:])
+    if len(uids):
+        n_uids = max(n_uids, int(uids.max()) + 1)
+    return np.bincount(
+        uids[:-1][is_running],
+        weights=(times[1:] - times[:-1])[is_running],
+        minlength=n_uids)
+
+
+def get_timing(records: np.ndarray, g: nx.Graph) -> TIMING_MAP:
+    """
+    Get the timing of all nodes.
+
+    :param records: State changes in chronological order.
+    :param g: Graph representing the behavior tree.
+
+    :return: Timing per node, `None` for nodes that never changed state.
+    """
+    n_uids = max(g.nodes(), default=-1) + 1
+    if len(records):
+        n_uids = max(n_uids, int(records['uid'].max()) + 1)
+    ticked = np.bincount(records['uid'], minlength=n_uids) > 0
+    uids, durations = get_durations(records)
+    n_executions = np.bincount(uids, minlength=n_uids)
+    sum_durations = np.bincount(uids, weights=durations, minlength=n_uids)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sum_durations / n_executions
+    percentiles = _group_percentiles(
+        uids.astype(np.intp), durations.astype(np.float64), n_uids,
+        PERCENTILES)
+    running = get_running_times(records, n_uids)
+
+    # convert from microseconds to seconds
+    columns: List[list] = [
+        n_executions.tolist(),
+        (mean / 1E6).tolist(),
+        *(percentiles / 1E6).T.tolist(),
+        (running / 1E6).tolist(),
+    ]
+    timing: TIMING_MAP = dict.fromkeys(g.nodes())
+    for id_ in g.nodes():
+        if ticked[id_]:
+            timing[id_] = NodeTiming(*(column[id_] for column in columns))
+    return timing
+
+
+def read_timing_fbl(fname: str, g: nx.Graph) -> TIMING_MAP:
+    """Read the timing of all nodes from a log file, see `get_timing`."""
+    with open_fbl(fname) as buf:
+        return get_timing(read_records(buf), g)
+
+
+def get_slowest(timing: TIMING_MAP, n: int = 10,
+                key: str = 'p95_s') -> List[Tuple[int, NodeTiming]]:
+    """Get the `n` nodes with the highest value of `key`."""
+    completed = [
+        (id_, t) for id_, t in timing.items()
+        if t is not None and t.n_executions > 0
+    ]
+    return sorted(
+        completed, key=lambda x: getattr(x[1], key), reverse=True)[:n]
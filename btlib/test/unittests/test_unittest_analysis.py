@@ -13,9 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import unittest
 
-from btlib.analysis import get_coverage
+from btlib.analysis import get_coverage, get_coverage_fbl
+from btlib.bts import fbl_to_networkx
+from btlib.logs import read_log_fbl
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '_test_data')
 
 
 class TestAnalysis(unittest.TestCase):
@@ -61,3 +66,15 @@ class TestAnalysis(unittest.TestCase):
         }
         with self.assertRaises(ValueError):
             get_coverage(data_invalid)
+
+    def test_get_coverage_fbl(self):
+        """Coverage from a file is the same as from the values."""
+        fname = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        g = fbl_to_networkx(fname)
+        _, values = read_log_fbl(fname, g)
+        for chunk_records in [1, 100, 1000000]:
+            self.assertEqual(
+                get_coverage_fbl(fname, g, chunk_records),
+                get_coverage(values))
+        # this file has 12 nodes and 6 are covered
+        self.assertEqual(get_coverage_fbl(fname, g), 0.5)
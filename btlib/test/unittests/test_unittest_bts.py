@@ -19,7 +19,8 @@ from unittest.mock import patch
 
 from bs4 import BeautifulSoup
 
-from btlib.bts import (assemble_subtrees, xml_to_networkx)
+from btlib.bts import (assemble_subtrees, fbl_to_networkx, xml_to_networkx)
+from btlib.fbl_reader import FINGERPRINT, get_fingerprint, read_bt_arrays
 
 
 def _mock_read_xml_file():
@@ -82,6 +83,33 @@ class UnittestBTs(unittest.TestCase):
 
     #     self.assertEqual(g.number_of_nodes(), 5)
 
+    def test_fbl_to_networkx_fingerprint(self):
+        """The fingerprint depends only on the tree."""
+        g = fbl_to_networkx(os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl'))
+        g2 = fbl_to_networkx(os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl'))
+        self.assertEqual(g.number_of_nodes(), 12)
+        self.assertEqual(len(g.graph[FINGERPRINT]), 32)
+        self.assertEqual(g.graph[FINGERPRINT], g2.graph[FINGERPRINT])
+
+        # another tree has another fingerprint
+        g_other = fbl_to_networkx(
+            os.path.join(TEST_DATA_DIR, 'bt_trace_other.fbl'))
+        self.assertNotEqual(g.graph[FINGERPRINT], g_other.graph[FINGERPRINT])
+
+    def test_fingerprint_children_order(self):
+        """The order of the children is part of the fingerprint."""
+        with open(os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl'), 'rb') as f:
+            tree = read_bt_arrays(f.read())
+        # swap the first two children of the first node with two children
+        i_edge = next(
+            i for i in range(len(tree.parents) - 1)
+            if tree.parents[i] == tree.parents[i + 1])
+        children = tree.children.copy()
+        children[[i_edge, i_edge + 1]] = children[[i_edge + 1, i_edge]]
+        self.assertNotEqual(
+            get_fingerprint(tree),
+            get_fingerprint(tree._replace(children=children)))
+
     def test_assemble_subtrees(self):
         """Testing assemble_subtrees."""
         self.assertRaises(NotImplementedError, assemble_subtrees, None, None)
@@ -0,0 +1,95 @@
+"""Tests for the btlib.cache module."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from btlib.cache import (evict_lru, get_cache_dir, get_cache_key,
+                         read_stats_fbl_cached)
+from btlib.fbl_reader import tree_arrays_to_networkx
+from btlib.logs import read_stats_fbl
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '_test_data')
+
+
+class UnittestCache(unittest.TestCase):
+    """Tests for the btlib.cache module."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.fname = os.path.join(self.tmp_dir, 'bt_trace1.fbl')
+        shutil.copy(os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl'), self.fname)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_read_stats_fbl_cached(self):
+        """The second read comes from the cache and is the same."""
+        g_expected, stats_expected = read_stats_fbl(self.fname)
+        tree, stats = read_stats_fbl_cached(self.fname, self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        with patch('btlib.cache.read_tree_arrays_and_stats_fbl') as mock:
+            tree_cached, stats_cached = read_stats_fbl_cached(
+                self.fname, self.cache_dir)
+            mock.assert_not_called()
+        for tree_out, stats_out in [(tree, stats), (tree_cached, stats_cached)]:
+            g_out = tree_arrays_to_networkx(tree_out)
+            self.assertEqual(str(g_out.adj), str(g_expected.adj))
+            self.assertEqual(dict(g_out.nodes(data=True)),
+                             dict(g_expected.nodes(data=True)))
+            self.assertEqual(stats_out.to_value_maps(),
+                             stats_expected.to_value_maps())
+
+    def test_default_cache_dir(self):
+        """The cache dir follows XDG_CACHE_HOME when it is used."""
+        with patch.dict(os.environ, {'XDG_CACHE_HOME': self.tmp_dir}):
+            self.assertEqual(
+                get_cache_dir(), os.path.join(self.tmp_dir, 'bt_tools'))
+            read_stats_fbl_cached(self.fname)
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.tmp_dir, 'bt_tools'))), 1)
+
+    def test_cache_key_changes(self):
+        """Changing the file changes the key."""
+        key = get_cache_key(self.fname)
+        self.assertEqual(key, get_cache_key(self.fname))
+        with open(self.fname, 'ab') as f:
+            f.write(b'\x00' * 12)
+        self.assertNotEqual(key, get_cache_key(self.fname))
+
+    def test_broken_entry(self):
+        """A broken cache entry is replaced."""
+        read_stats_fbl_cached(self.fname, self.cache_dir)
+        entry, = os.listdir(self.cache_dir)
+        with open(os.path.join(self.cache_dir, entry), 'wb') as f:
+            f.write(b'broken')
+        _, stats = read_stats_fbl_cached(self.fname, self.cache_dir)
+        self.assertEqual(stats.to_value_maps(),
+                         read_stats_fbl(self.fname)[1].to_value_maps())
+
+    def test_evict_lru(self):
+        """The least recently used files are removed first."""
+        os.makedirs(self.cache_dir)
+        for i in range(4):
+            path = os.path.join(self.cache_dir, f'{i}')
+            with open(path, 'wb') as f:
+                f.write(b'x' * 10)
+            os.utime(path, ns=(i, [3, 0, 2, 1][i]))
+        evict_lru(self.cache_dir, 25)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['0', '2'])
@@ -0,0 +1,106 @@
+"""Tests for the btlib.coalesce module."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import Counter
+import threading
+import unittest
+
+from btlib.coalesce import Coalescer
+
+
+class UnittestCoalesce(unittest.TestCase):
+    """Tests for the btlib.coalesce module."""
+
+    def test_coalescer(self):
+        """The latest state per node is kept and replaced ones counted."""
+        coalescer = Coalescer(rate_hz=10.)
+        self.assertAlmostEqual(coalescer.period_s, .1)
+        coalescer.add({1: 'RUNNING', 2: 'RUNNING'})
+        coalescer.add({1: 'SUCCESS'})
+        coalescer.add({1: 'IDLE', 3: 'FAILURE'})
+        frame = coalescer.flush()
+        self.assertEqual(
+            frame.states, {1: 'IDLE', 2: 'RUNNING', 3: 'FAILURE'})
+        self.assertEqual(frame.transitions, {1: 3, 2: 1, 3: 1})
+        self.assertEqual(frame.dropped, 2)
+
+        # the next frame starts empty
+        self.assertEqual(coalescer.flush(), ({}, {}, 0))
+        coalescer.add({2: 'SUCCESS'})
+        coalescer.add({2: 'IDLE'})
+        self.assertEqual(coalescer.flush(), ({2: 'IDLE'}, {2: 2}, 1))
+        self.assertEqual(coalescer.dropped_total, 3)
+
+    def test_coalescer_events(self):
+        """Repeated changes of a node added one by one are all counted."""
+        coalescer = Coalescer()
+        for node, state in [(1, 'RUNNING'), (1, 'SUCCESS'), (1, 'RUNNING')]:
+            coalescer.add({node: state})
+        self.assertEqual(coalescer.flush(), ({1: 'RUNNING'}, {1: 3}, 2))
+
+    def test_coalescer_frames(self):
+        """A message split by a frame boundary loses no event."""
+        coalescer = Coalescer()
+        message = [(1, 'RUNNING'), (2, 'RUNNING'), (1, 'SUCCESS'),
+                   (1, 'RUNNING'), (2, 'FAILURE'), (1, 'IDLE')]
+        # the timer flushes after the third event of the message
+        for node, state in message[:3]:
+            coalescer.add({node: state})
+        self.assertEqual(coalescer.flush(), (
+            {1: 'SUCCESS', 2: 'RUNNING'}, {1: 2, 2: 1}, 1))
+        for node, state in message[3:]:
+            coalescer.add({node: state})
+        self.assertEqual(coalescer.flush(), (
+            {1: 'IDLE', 2: 'FAILURE'}, {1: 2, 2: 1}, 1))
+        self.assertEqual(coalescer.dropped_total, 2)
+
+    def test_coalescer_concurrent(self):
+        """Frames flushed while events are added keep every transition."""
+        coalescer = Coalescer()
+        n_events = 10_000
+        events = [(i % 7, i) for i in range(n_events)]
+
+        def add_events():
+            for node, state in events:
+                coalescer.add({node: state})
+
+        thread = threading.Thread(target=add_events)
+        frames = []
+        thread.start()
+        while thread.is_alive():
+            frames.append(coalescer.flush())
+        thread.join()
+        frames.append(coalescer.flush())
+
+        transitions: Counter = Counter()
+        latest = {}
+        for frame in frames:
+            transitions.update(frame.transitions)
+            latest.update(frame.states)
+            # within a frame, all but the latest state are dropped
+            self.assertEqual(
+                frame.dropped,
+                sum(frame.transitions.values()) - len(frame.states))
+        self.assertEqual(
+            transitions, Counter(node for node, _ in events))
+        self.assertEqual(latest, dict(events))
+        self.assertEqual(
+            coalescer.dropped_total,
+            n_events - sum(len(frame.states) for frame in frames))
+
+    def test_coalescer_rate(self):
+        """The rate must be positive."""
+        with self.assertRaises(ValueError):
+            Coalescer(rate_hz=0.)
@@ -0,0 +1,227 @@
+"""Tests for the btlib.fbl_reader module."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+from btlib.common import NODE_STATE
+from btlib.fbl_reader import (FINGERPRINT, get_state_indices,
+                              iter_log_chunks, open_fbl, read_bt,
+                              read_bt_arrays, read_log, read_records,
+                              RECORD_SIZE)
+from btlib.Serialization import BehaviorTree as bt_fb
+from btlib.Serialization import TreeNode as node_fb
+from btlib.Serialization.BehaviorTree import BehaviorTree
+import flatbuffers
+import numpy as np
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '_test_data')
+
+
+def _read_test_fbl():
+    with open(os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl'), 'rb') as f:
+        return bytearray(f.read())
+
+
+def _read_records_naive(buffer):
+    """Parse the records one by one, like bt_log_cat does."""
+    index = int.from_bytes(buffer[:4], 'little') + 4
+    records = []
+    while index + RECORD_SIZE <= len(buffer):
+        records.append((
+            int.from_bytes(buffer[index:index + 4], 'little'),
+            int.from_bytes(buffer[index + 4:index + 8], 'little'),
+            int.from_bytes(buffer[index + 8:index + 10], 'little'),
+            buffer[index + 10],
+            buffer[index + 11],
+        ))
+        index += RECORD_SIZE
+    return records
+
+
+def _build_fbl_header(nodes, root_uid=None):
+    """
+    Build the tree of a fbl file with the generated builder functions.
+
+    :param nodes: Tuples of (uid, children or None, instance name or None).
+    """
+    builder = flatbuffers.Builder(0)
+    offsets = []
+    for uid, children, name in nodes:
+        name_offset = None if name is None else builder.CreateString(name)
+        children_offset = None
+        if children is not None:
+            node_fb.TreeNodeStartChildrenUidVector(builder, len(children))
+            for child in reversed(children):
+                builder.PrependUint16(child)
+            children_offset = builder.EndVector()
+        node_fb.TreeNodeStart(builder)
+        node_fb.TreeNodeAddUid(builder, uid)
+        if children_offset is not None:
+            node_fb.TreeNodeAddChildrenUid(builder, children_offset)
+        if name_offset is not None:
+            node_fb.TreeNodeAddInstanceName(builder, name_offset)
+        offsets.append(node_fb.TreeNodeEnd(builder))
+    bt_fb.BehaviorTreeStartNodesVector(builder, len(offsets))
+    for offset in reversed(offsets):
+        builder.PrependUOffsetTRelative(offset)
+    nodes_offset = builder.EndVector()
+    bt_fb.BehaviorTreeStart(builder)
+    if root_uid is not None:
+        bt_fb.BehaviorTreeAddRootUid(builder, root_uid)
+    bt_fb.BehaviorTreeAddNodes(builder, nodes_offset)
+    builder.Finish(bt_fb.BehaviorTreeEnd(builder))
+    tree = builder.Output()
+    return bytearray(len(tree).to_bytes(4, 'little') + tree)
+
+
+class UnittestFblReader(unittest.TestCase):
+    """Tests for the btlib.fbl_reader module."""
+
+    def test_read_records(self):
+        """Decoded records must be the same as when parsing one by one."""
+        buf = _read_test_fbl()
+        records = read_records(buf)
+        expected = _read_records_naive(buf)
+        self.assertEqual(len(records), len(expected))
+        self.assertGreater(len(records), 0)
+        self.assertEqual(records.tolist(), expected)
+        # records are a view on the buffer
+        self.assertFalse(records.flags['OWNDATA'])
+
+    def test_read_records_incomplete(self):
+        """An incomplete record at the end is ignored."""
+        buf = _read_test_fbl()
+        n_records = len(read_records(buf))
+        self.assertEqual(len(read_records(buf[:-1])), n_records - 1)
+        self.assertEqual(len(read_records(buf + b'\x00')), n_records)
+
+    def test_read_log(self):
+        """The log contains uid and state per record."""
+        buf = _read_test_fbl()
+        log = read_log(buf)
+        records = read_records(buf)
+        self.assertEqual(len(log), len(records))
+        self.assertEqual([uid for uid, _ in log], records['uid'].tolist())
+        # the first record in this file changes from IDLE to RUNNING
+        self.assertEqual(log[0][1], NODE_STATE.RUNNING)
+
+    def test_read_log_unknown_state(self):
+        """Unknown states raise a ValueError."""
+        buf = _read_test_fbl()
+        read_records(buf)['status'][0] = 42
+        self.assertRaises(ValueError, read_log, buf)
+        read_records(buf)['status'][0] = -1
+        self.assertRaises(ValueError, read_log, buf)
+
+    def test_state_indices_dtype(self):
+        """All records map to an index of NODE_STATE."""
+        indices = get_state_indices(read_records(_read_test_fbl()))
+        self.assertTrue(np.all(indices >= 0))
+        self.assertTrue(np.all(indices < len(NODE_STATE)))
+
+    def test_open_fbl(self):
+        """The mapped file gives the same records as reading it."""
+        with open_fbl(os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')) as buf:
+            self.assertEqual(bytes(buf), bytes(_read_test_fbl()))
+            records_mapped = read_records(buf).tolist()
+        self.assertEqual(records_mapped, read_records(_read_test_fbl()).tolist())
+
+    def test_open_fbl_views_after_exit(self):
+        """Views on the mapped file can still be used after the context."""
+        with open_fbl(os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')) as buf:
+            records = read_records(buf)
+        self.assertEqual(
+            records.tolist(), read_records(_read_test_fbl()).tolist())
+
+    def test_open_fbl_empty(self):
+        """An empty file, e.g. of a run that just started, has no records."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, 'empty.fbl')
+            open(fname, 'wb').close()
+            with open_fbl(fname) as buf:
+                self.assertEqual(len(buf), 0)
+                self.assertEqual(len(read_records(buf)), 0)
+
+    def test_iter_log_chunks(self):
+        """Chunks are in order and contain all records."""
+        fname = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        records = read_records(_read_test_fbl())
+        for chunk_records in [1, 7, len(records), len(records) + 1]:
+            chunks = list(iter_log_chunks(fname, chunk_records))
+            self.assertTrue(all(len(c) <= chunk_records for c in chunks))
+            self.assertEqual(
+                np.concatenate(chunks).tolist(), records.tolist())
+        self.assertRaises(
+            AssertionError, lambda: list(iter_log_chunks(fname, 0)))
+
+    def test_read_bt_arrays(self):
+        """The tree is the same as read through the generated classes."""
+        self._assert_same_as_generated(_read_test_fbl())
+        with open_fbl(os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')) as buf:
+            self._assert_same_as_generated(buf)
+
+    def test_read_bt_arrays_missing_fields(self):
+        """Fields that are not in the buffer get the generated defaults."""
+        buf = _build_fbl_header([
+            (0, [1, 2], 'root'),
+            (1, None, None),
+            (2, [], 'leaf'),
+        ])
+        tree = self._assert_same_as_generated(buf)
+        self.assertEqual(tree.root, 0)
+        self.assertEqual(tree.instance_names, [b'root', None, b'leaf'])
+        self.assertEqual(tree.registration_names, [None, None, None])
+        self.assertEqual(tree.children.tolist(), [1, 2])
+        tree = self._assert_same_as_generated(
+            _build_fbl_header([(7, None, None)], root_uid=7))
+        self.assertEqual(tree.root, 7)
+
+    def _assert_same_as_generated(self, buf):
+        tree = read_bt_arrays(buf)
+        bt = BehaviorTree.GetRootAsBehaviorTree(buf, 4)
+        self.assertEqual(tree.root, bt.RootUid())
+        self.assertEqual(len(tree.uids), bt.NodesLength())
+        edges = []
+        for i in range(bt.NodesLength()):
+            node = bt.Nodes(i)
+            self.assertEqual(tree.uids[i], node.Uid())
+            self.assertEqual(tree.instance_names[i], node.InstanceName())
+            self.assertEqual(
+                tree.registration_names[i], node.RegistrationName())
+            children = [] if node.ChildrenUidIsNone() else \
+                node.ChildrenUidAsNumpy().tolist()
+            self.assertEqual(
+                tree.children[tree.parents == node.Uid()].tolist(), children)
+            edges.extend(
+                (node.Uid(), node.ChildrenUid(j), j)
+                for j in range(node.ChildrenUidLength()))
+        self.assertEqual(
+            list(zip(tree.parents.tolist(), tree.children.tolist(),
+                     tree.child_indices.tolist())),
+            edges)
+        return tree
+
+    def test_read_bt(self):
+        """The graph has all nodes and edges, ordered by the child index."""
+        g = read_bt(_read_test_fbl())
+        tree = read_bt_arrays(_read_test_fbl())
+        self.assertEqual(list(g.nodes), tree.uids.tolist())
+        self.assertEqual(g.number_of_edges(), g.number_of_nodes() - 1)
+        for n in g.nodes:
+            labels = [g.edges[n, c]['label'] for c in g.successors(n)]
+            self.assertEqual(labels, list(range(len(labels))))
+        self.assertIn(FINGERPRINT, g.graph)
@@ -0,0 +1,83 @@
+"""Tests for the btlib.follow module."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+from btlib.fbl_reader import get_header_size, RECORD_SIZE
+from btlib.follow import FblFollower
+from btlib.logs import read_stats_fbl
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '_test_data')
+
+
+class UnittestFollow(unittest.TestCase):
+    """Tests for the btlib.follow module."""
+
+    def setUp(self):
+        self.src = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        with open(self.src, 'rb') as f:
+            self.content = f.read()
+        fd, self.fname = tempfile.mkstemp(suffix='.fbl')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.fname)
+
+    def _write(self, content):
+        with open(self.fname, 'wb') as f:
+            f.write(content)
+
+    def test_follow_growing_file(self):
+        """Reading the file while it grows gives the same as at once."""
+        follower = FblFollower(self.fname)
+        self.assertEqual(len(follower.poll()), 0)
+        self.assertIsNone(follower.g)
+
+        # the tree is incomplete
+        records_start = get_header_size(self.content) + 4
+        self._write(self.content[:records_start - 1])
+        self.assertEqual(len(follower.poll()), 0)
+        self.assertIsNone(follower.g)
+
+        # the tree and one and a half records
+        self._write(self.content[:records_start + RECORD_SIZE * 3 // 2])
+        self.assertEqual(len(follower.poll()), 1)
+        self.assertIsNotNone(follower.g)
+        self.assertEqual(len(follower.poll()), 0)
+
+        # the rest, read in small batches
+        self._write(self.content)
+        n_total = (len(self.content) - records_start) // RECORD_SIZE
+        self.assertEqual(len(follower.poll(max_records=5)), 5)
+        self.assertEqual(len(follower.poll()), n_total - 6)
+        self.assertEqual(follower.n_records, n_total)
+
+        _, stats_expected = read_stats_fbl(self.src)
+        self.assertEqual(follower.stats.to_value_maps(),
+                         stats_expected.to_value_maps())
+
+    def test_follow_truncated_file(self):
+        """A truncated file is read again from the start."""
+        self._write(self.content)
+        follower = FblFollower(self.fname)
+        n_total = len(follower.poll())
+        records_start = get_header_size(self.content) + 4
+        self._write(self.content[:records_start + RECORD_SIZE])
+        self.assertEqual(len(follower.poll()), 1)
+        self.assertEqual(follower.n_records, 1)
+        self.assertEqual(follower.stats.totals.sum(), 1)
+        self.assertGreater(n_total, 1)
@@ -13,12 +13,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import unittest
 
-from btlib.logs import (_get_id_and_state_from_line)
+from btlib.bts import fbl_to_networkx
+from btlib.common import NODE_STATE
+from btlib.fbl_reader import read_log
+from btlib.logs import (_get_id_and_state_from_line, merge_values,
+                        read_log_fbl, read_stats_fbl, read_tree_and_log_fbl,
+                        read_tree_and_state_counts_fbl,
+                        read_tree_arrays_and_stats_fbl, to_value_maps)
+from btlib.stats import merge_state_counts
 
 import networkx as nx
 
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '_test_data')
+
 
 def _make_demo_graph():
     g = nx.DiGraph()
@@ -79,6 +89,80 @@ class UnittestLogs(unittest.TestCase):
         self.assertEqual(id3, 999)
         self.assertEqual(rs3, rs3.FAILURE)
 
+    def test_read_log_fbl_real_file(self):
+        """Compare the aggregated values to counting record by record."""
+        path = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        g = fbl_to_networkx(path)
+        v_cnt, v_states = read_log_fbl(path, g)
+        with open(path, 'rb') as f:
+            log = read_log(bytearray(f.read()))
+
+        expected_cnt = dict.fromkeys(g.nodes)
+        expected_states = dict.fromkeys(g.nodes)
+        for id_, rs in log:
+            if expected_cnt[id_] is None:
+                expected_cnt[id_] = 0
+                expected_states[id_] = [0 for _ in NODE_STATE]
+            expected_cnt[id_] += 1
+            expected_states[id_][rs.value - 1] += 1
+        self.assertEqual(v_cnt, expected_cnt)
+        self.assertEqual(v_states, expected_states)
+        for id_ in g.nodes:
+            if v_cnt[id_] is not None:
+                self.assertIsInstance(v_cnt[id_], int)
+
+    def test_read_tree_and_log_fbl(self):
+        """Reading tree and log at once gives the same as separately."""
+        path = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        g, v_cnt, v_states = read_tree_and_log_fbl(path)
+        g_expected = fbl_to_networkx(path)
+        self.assertEqual(str(g.adj), str(g_expected.adj))
+        self.assertEqual(dict(g.nodes(data=True)),
+                         dict(g_expected.nodes(data=True)))
+        self.assertEqual((v_cnt, v_states), read_log_fbl(path, g_expected))
+
+    def test_merge_state_counts(self):
+        """Merging counts is the same as merging the value maps."""
+        path = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        g, counts = read_tree_and_state_counts_fbl(path)
+        for n_logs in [1, 2, 5]:
+            merged = merge_state_counts([counts] * n_logs)
+            self.assertEqual(merged.tolist(), (counts * n_logs).tolist())
+            v_cnt, v_states = None, None
+            for _ in range(n_logs):
+                vc, vs = to_value_maps(g, counts)
+                v_cnt = merge_values(v_cnt, vc)
+                v_states = merge_values(v_states, vs)
+            self.assertEqual(to_value_maps(g, merged), (v_cnt, v_states))
+        # counts of different length
+        merged = merge_state_counts([counts[:3], counts, counts[:1]])
+        self.assertEqual(len(merged), len(counts))
+        self.assertEqual(merged[0].tolist(), (counts[0] * 3).tolist())
+        self.assertEqual(merged[5].tolist(), counts[5].tolist())
+
+    def test_read_stats_fbl(self):
+        """Read stats that hold the same values as the value maps."""
+        path = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        g, stats = read_stats_fbl(path)
+        v_cnt, v_states = read_log_fbl(path, g)
+        self.assertEqual(stats.to_value_maps(), (v_cnt, v_states))
+        self.assertEqual(stats.get_counts(), v_cnt)
+        for id_ in g.nodes:
+            self.assertEqual(stats[id_], v_states[id_])
+        merged = merge_values(stats, stats)
+        self.assertEqual(
+            merged.to_value_maps()[1],
+            merge_values(v_states, v_states))
+
+    def test_read_tree_arrays_and_stats_fbl(self):
+        """Read the same tree and stats without building the graph."""
+        path = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        tree, stats = read_tree_arrays_and_stats_fbl(path)
+        g, stats_expected = read_stats_fbl(path)
+        self.assertEqual(tree.uids.tolist(), list(g.nodes))
+        self.assertEqual(stats.uids.tolist(), stats_expected.uids.tolist())
+        self.assertEqual(stats.counts.tolist(), stats_expected.counts.tolist())
+
     # def test_read_log_fbl(self):
     #     path = '/tmp/test.fbl'
     #     g = _make_demo_graph()
@@ -0,0 +1,108 @@
+"""Tests for the btlib.stats module."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from btlib.analysis import get_coverage
+from btlib.common import NODE_STATE
+from btlib.fbl_reader import RECORD_DTYPE
+from btlib.Serialization.NodeStatus import NodeStatus
+from btlib.stats import NodeStats
+import numpy as np
+
+
+class UnittestStats(unittest.TestCase):
+    """Tests for the btlib.stats module."""
+
+    def test_add_records(self):
+        """Records are counted per node and state."""
+        stats = NodeStats([3, 10, 7])
+        records = np.array([
+            (0, 0, 10, NodeStatus.IDLE, NodeStatus.RUNNING),
+            (0, 1, 10, NodeStatus.RUNNING, NodeStatus.SUCCESS),
+            (0, 2, 3, NodeStatus.IDLE, NodeStatus.FAILURE),
+            # unknown uids are ignored
+            (0, 3, 42, NodeStatus.IDLE, NodeStatus.FAILURE),
+        ], dtype=RECORD_DTYPE)
+        stats.add_records(records)
+        self.assertEqual(stats[7], None)
+        expected_10 = [0] * len(NODE_STATE)
+        expected_10[NODE_STATE.RUNNING.value - 1] = 1
+        expected_10[NODE_STATE.SUCCESS.value - 1] = 1
+        self.assertEqual(stats[10], expected_10)
+        self.assertEqual(stats[3][NODE_STATE.FAILURE.value - 1], 1)
+        self.assertEqual(stats.never_ticked.tolist(), [False, False, True])
+        self.assertEqual(stats.get_counts(), {3: 1, 10: 2, 7: None})
+        self.assertEqual(list(stats), [3, 10, 7])
+        self.assertNotIn(42, stats)
+        self.assertRaises(KeyError, lambda: stats[42])
+
+        doubled = NodeStats.merge([stats, stats])
+        self.assertEqual(doubled.counts.tolist(), (stats.counts * 2).tolist())
+        self.assertEqual((stats + stats).counts.tolist(),
+                         doubled.counts.tolist())
+        self.assertRaises(AssertionError, NodeStats.merge,
+                          [stats, NodeStats([3, 10])])
+
+    def test_from_state_counts(self):
+        """State counts indexed by uid are moved to the rows."""
+        state_counts = np.arange(3 * len(NODE_STATE)).reshape(3, -1)
+        stats = NodeStats.from_state_counts([2, 0, 5], state_counts)
+        self.assertEqual(stats[2], state_counts[2].tolist())
+        self.assertEqual(stats[0], state_counts[0].tolist())
+        # uid 5 is not in the state counts
+        self.assertEqual(stats[5], None)
+        stats = NodeStats.from_state_counts([1], np.zeros((2, 4), int))
+        self.assertEqual(stats[1], None)
+
+    def test_aggregate(self):
+        """Counts of groups of nodes are summed up."""
+        stats = NodeStats([0, 1, 2, 3], np.array([
+            [1, 0, 0, 0],
+            [0, 2, 0, 0],
+            [0, 0, 3, 4],
+            [0, 0, 0, 0],
+        ]))
+        aggregated = stats.aggregate({0: [0], 1: [1, 2, 3], 3: [3]})
+        self.assertEqual(list(aggregated), [0, 1, 3])
+        self.assertEqual(aggregated[0], [1, 0, 0, 0])
+        self.assertEqual(aggregated[1], [0, 2, 3, 4])
+        self.assertIsNone(aggregated[3])
+        with self.assertRaises(AssertionError):
+            stats.aggregate({0: [0, 42]})
+
+    def test_select(self):
+        """The counts of some nodes are taken in the given order."""
+        stats = NodeStats([0, 1, 2], np.array([
+            [1, 0, 0, 0],
+            [0, 2, 0, 0],
+            [0, 0, 3, 4],
+        ]))
+        selected = stats.select([2, 0])
+        self.assertEqual(list(selected), [2, 0])
+        self.assertEqual(selected[2], [0, 0, 3, 4])
+        self.assertEqual(selected[0], [1, 0, 0, 0])
+        self.assertNotIn(1, selected)
+        with self.assertRaises(AssertionError):
+            stats.select([42])
+
+    def test_get_coverage(self):
+        """Coverage of NodeStats is the same as of value maps."""
+        stats = NodeStats.from_state_counts(
+            [0, 1, 2], np.array([[1, 0, 0, 0], [0, 0, 0, 0], [0, 2, 0, 1]]))
+        self.assertEqual(get_coverage(stats), 2 / 3)
+        self.assertEqual(get_coverage(stats), get_coverage(
+            stats.to_value_maps()[1]))
+        self.assertEqual(get_coverage(NodeStats([])), 0.0)
@@ -0,0 +1,127 @@
+"""Tests for the btlib.timing module."""
+# Copyright (c) 2024 - see the NOTICE file for details
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import os
+import unittest
+
+from btlib.bts import fbl_to_networkx
+from btlib.fbl_reader import read_records, RECORD_DTYPE
+from btlib.Serialization.NodeStatus import NodeStatus
+from btlib.timing import (get_durations, get_slowest, get_timing,
+                          read_timing_fbl)
+import networkx as nx
+import numpy as np
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '_test_data')
+
+IDL = NodeStatus.IDLE
+RUN = NodeStatus.RUNNING
+SUC = NodeStatus.SUCCESS
+FAI = NodeStatus.FAILURE
+
+
+def _make_records(changes):
+    """Make records from tuples of (time in us, uid, prev status, status)."""
+    return np.array([
+        (t // 1_000_000, t % 1_000_000, uid, prev, status)
+        for t, uid, prev, status in changes
+    ], dtype=RECORD_DTYPE)
+
+
+def _make_graph(n_nodes):
+    g = nx.DiGraph()
+    g.add_nodes_from(range(n_nodes))
+    return g
+
+
+class UnittestTiming(unittest.TestCase):
+    """Tests for the btlib.timing module."""
+
+    def test_get_timing(self):
+        """Timing of an interleaved log of two nodes."""
+        records = _make_records([
+            (1_000_000, 1, IDL, RUN),
+            (1_500_000, 2, IDL, SUC),
+            (2_000_000, 1, RUN, SUC),
+            (2_000_001, 1, SUC, IDL),
+            (3_000_000, 1, IDL, RUN),
+            (3_100_000, 2, SUC, IDL),
+            (6_000_000, 1, RUN, FAI),
+            (7_000_000, 2, IDL, RUN),
+        ])
+        timing = get_timing(records, _make_graph(4))
+        self.assertIsNone(timing[0])
+        self.assertIsNone(timing[3])
+
+        t1 = timing[1]
+        self.assertEqual(t1.n_executions, 2)
+        self.assertAlmostEqual(t1.mean_s, 2.0)
+        self.assertAlmostEqual(t1.running_s, 4.0)
+        self.assertAlmostEqual(t1.p50_s, 2.0)
+        self.assertAlmostEqual(t1.p95_s, 1.0 + 2.0 * 0.95)
+        self.assertAlmostEqual(t1.p99_s, 1.0 + 2.0 * 0.99)
+
+        t2 = timing[2]
+        self.assertEqual(t2.n_executions, 1)
+        self.assertEqual(t2.p50_s, 0.0)
+        # the last state change has no end
+        self.assertEqual(t2.running_s, 0.0)
+
+    def test_get_durations_repeated(self):
+        """Every start is used once and halted executions are not counted."""
+        records = _make_records([
+            (0, 0, IDL, RUN),
+            (1_000_000, 0, RUN, IDL),
+            (2_000_000, 0, IDL, RUN),
+            (2_500_000, 0, RUN, RUN),
+            (4_000_000, 0, RUN, SUC),
+            (5_000_000, 0, SUC, RUN),
+            (7_000_000, 0, RUN, FAI),
+            (7_500_000, 0, FAI, SUC),
+            (8_000_000, 0, SUC, IDL),
+        ])
+        uids, durations = get_durations(records)
+        self.assertEqual(uids.tolist(), [0, 0])
+        self.assertEqual(durations.tolist(), [2_000_000, 2_000_000])
+
+    def test_no_executions(self):
+        """Nodes that never completed have no durations."""
+        records = _make_records([(0, 0, IDL, RUN)])
+        timing = get_timing(records, _make_graph(1))
+        self.assertEqual(timing[0].n_executions, 0)
+        self.assertTrue(math.isnan(timing[0].p50_s))
+        self.assertEqual(get_slowest(timing), [])
+
+    def test_read_timing_fbl(self):
+        """Percentiles are the same as computed per node."""
+        fname = os.path.join(TEST_DATA_DIR, 'bt_trace1.fbl')
+        g = fbl_to_networkx(fname)
+        timing = read_timing_fbl(fname, g)
+        with open(fname, 'rb') as f:
+            records = read_records(bytearray(f.read()))
+        uids, durations = get_durations(records)
+        self.assertGreater(len(durations), 0)
+        self.assertTrue(np.all(durations >= 0))
+        for id_ in set(uids.tolist()):
+            d = durations[uids == id_] / 1E6
+            self.assertEqual(timing[id_].n_executions, len(d))
+            for p, value in zip(
+                    (50, 95, 99),
+                    timing[id_][2:5]):
+                self.assertAlmostEqual(value, np.percentile(d, p))
+        slowest = get_slowest(timing, n=3)
+        self.assertEqual(len(slowest), 3)
+        self.assertGreaterEqual(slowest[0][1].p95_s, slowest[1][1].p95_s)